@@ -1,22 +1,62 @@
 import streamlit as st
 import datetime
+import hashlib
 import uuid
 import json 
+import hotel_catalogue
+import job_queue
+import record_history
 import services
-import pdf_generator
-import html_generator # Import the new HTML generator
 import ui_components
 
 # --- PAGE CONFIGURATION & CLIENT INITIALIZATION ---
 st.set_page_config(page_title="Travaky Document Generator", layout="wide")
-supabase = services.init_supabase_connection()
-llm_client = services.init_groq_client()
+
+@st.cache_resource
+def load_settings() -> services.Settings:
+    """Environment variables, overridden by .streamlit/secrets.toml when there is one."""
+    settings = services.Settings.from_env()
+    try:
+        return settings.with_secrets(st.secrets)
+    except FileNotFoundError:
+        return settings
+
+@st.cache_resource
+def init_supabase_connection():
+    """Initializes and returns the Supabase client."""
+    return services.create_supabase_client(load_settings())
+
+@st.cache_resource
+def init_groq_client():
+    """Initializes and returns the Groq LLM client."""
+    return services.create_llm_client(load_settings())
+
+try:
+    supabase = init_supabase_connection()
+except services.ConfigurationError as e:
+    st.error(f"Supabase is not configured: {e}")
+    st.stop()
+llm_client = init_groq_client()
+
+@st.cache_resource
+def start_job_workers() -> job_queue.JobQueue:
+    """One queue handle per server process, plus its in-process worker threads (TRAVAKY_JOB_WORKERS)."""
+    queue = job_queue.JobQueue()
+    if job_queue.INPROCESS_WORKERS:
+        job_queue.WorkerPool(queue, supabase, llm_client, job_queue.INPROCESS_WORKERS).start()
+    return queue
+
+jobs = start_job_workers()
 
 st.title("Travaky Document Generator")
 
-# Fetch all hotels once and pass the list to the UI component.
-all_hotels = services.get_all_hotels(supabase)
-ui_components.manage_trips_and_guests(all_hotels)
+# The hotel index is built once per catalogue version and shared across sessions.
+try:
+    hotel_index = services.get_hotel_index(supabase)
+except services.HotelCatalogueError as e:
+    st.error(f"Fatal Error: Could not fetch hotel database. {e}")
+    hotel_index = hotel_catalogue.HotelIndex(())
+ui_components.manage_trips_and_guests(hotel_index)
 st.markdown("---")
 
 # --- MAIN FORM FOR DOCUMENT GENERATION ---
@@ -56,6 +96,7 @@ with st.form("travel_form"):
     wants_pdf_hotel = c2.checkbox("PDF Hotel Booking", True)
     wants_pdf_itinerary = c3.checkbox("PDF Itinerary", True)
     wants_pdf_cover = c4.checkbox("PDF Cover Letter", True)
+    bundle_pdfs = st.checkbox("Bundle the PDFs into one visa pack", help="One PDF with a bookmark per document: a single file to send and a single upload.")
     
     st.markdown("##### HTML Format (Ocean Blue Theme)")
     c1, c2, c3, c4 = st.columns(4)
@@ -63,6 +104,7 @@ with st.form("travel_form"):
     wants_html_hotel = c2.checkbox("HTML Hotel Booking")
     wants_html_itinerary = c3.checkbox("HTML Itinerary")
     wants_html_cover = c4.checkbox("HTML Cover Letter")
+    polish_cover_letter = st.checkbox("Polish cover letter wording with AI (slower)", help="By default the cover letter is filled in locally from the template.")
 
     submitted = st.form_submit_button("Generate & Store Documents", type="primary")
 
@@ -83,92 +125,64 @@ if submitted:
                     "hotel_data": st.session_state[selection_key]
                 })
 
-        record_uuid = str(uuid.uuid4())
         full_trips_data = st.session_state.trips
         family_data = [m for m in st.session_state.family_members if m.get('name')]
         selected_hotel_names = ", ".join([stay['hotel_data']['Hotel Name'] for stay in selected_hotels_per_trip]) if selected_hotels_per_trip else None
 
         form_data = {
-            "uuid": record_uuid, "passenger_name": passenger_name, "age": age, "gender": gender,
+            "passenger_name": passenger_name, "age": age, "gender": gender,
             "hometown": hometown, "flight_cost": flight_cost,
             "trips": full_trips_data, "family_members": family_data, "job_title": job_title,
             "company_name": company_name, "joining_date": str(joining_date), "passport_number": passport_number,
             "phone_number": phone_number, # <-- ADD THIS LINE
             "selected_hotels_per_trip": selected_hotels_per_trip, "selected_hotel": selected_hotel_names
         }
+
+        # A retry of the same inputs keeps the uuid and created_at, so it re-renders identical documents
+        # (served from the document cache) to the same storage paths; edited inputs make a new record.
+        fingerprint = hashlib.sha256(json.dumps([form_data, polish_cover_letter], sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        pending_job = jobs.get(st.session_state.get('pending_record_uuid', ''))
+        if (st.session_state.get('pending_record_fingerprint') != fingerprint
+                or (pending_job is not None and pending_job.status == job_queue.DONE)):
+            st.session_state.pending_record_uuid = str(uuid.uuid4())
+            st.session_state.pending_record_created_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+            st.session_state.pending_record_fingerprint = fingerprint
+        record_uuid = st.session_state.pending_record_uuid
+        form_data = {"uuid": record_uuid, "created_at": st.session_state.pending_record_created_at, **form_data}
         
-        document_urls = {}
-        with st.spinner("Generating and uploading documents..."):
-            # --- PDF GENERATION ---
-            if wants_pdf_flight:
-                pdf_bytes = pdf_generator.create_flight_ticket_pdf(form_data)
-                url = services.upload_and_get_url(supabase, pdf_bytes, "travel-documents", f"{record_uuid}/flight.pdf", "application/pdf")
-                if url: document_urls['pdf_flight_ticket_url'] = url
-            
-            if wants_pdf_hotel and selected_hotels_per_trip:
-                pdf_bytes = pdf_generator.create_hotel_booking_pdf(form_data)
-                url = services.upload_and_get_url(supabase, pdf_bytes, "travel-documents", f"{record_uuid}/hotel.pdf", "application/pdf")
-                if url: document_urls['pdf_hotel_booking_url'] = url
-
-            if wants_pdf_itinerary:
-                pdf_bytes = pdf_generator.create_itinerary_pdf(form_data)
-                url = services.upload_and_get_url(supabase, pdf_bytes, "travel-documents", f"{record_uuid}/itinerary.pdf", "application/pdf")
-                if url: document_urls['pdf_itinerary_url'] = url
-
-            if wants_pdf_cover:
-                text = services.generate_cover_letter_text(llm_client, form_data)
-                pdf_bytes = pdf_generator.create_cover_letter_pdf(text)
-                url = services.upload_and_get_url(supabase, pdf_bytes, "travel-documents", f"{record_uuid}/cover_letter.pdf", "application/pdf")
-                if url: document_urls['pdf_cover_letter_url'] = url
-
-            # --- HTML GENERATION ---
-            if wants_html_flight:
-                html_content = html_generator.create_flight_ticket_html(form_data).encode('utf-8')
-                url = services.upload_and_get_url(supabase, html_content, "travel-documents", f"{record_uuid}/flight.html", "text/html")
-                if url: document_urls['html_flight_url'] = url
-            
-            if wants_html_hotel and selected_hotels_per_trip:
-                html_content = html_generator.create_hotel_booking_html(form_data).encode('utf-8')
-                url = services.upload_and_get_url(supabase, html_content, "travel-documents", f"{record_uuid}/hotel.html", "text/html")
-                if url: document_urls['html_hotel_url'] = url
-
-            if wants_html_itinerary:
-                html_content = html_generator.create_itinerary_html(form_data).encode('utf-8')
-                url = services.upload_and_get_url(supabase, html_content, "travel-documents", f"{record_uuid}/itinerary.html", "text/html")
-                if url: document_urls['html_itinerary_url'] = url
-
-            if wants_html_cover:
-                text = services.generate_cover_letter_text(llm_client, form_data)
-                html_content = html_generator.create_cover_letter_html(text).encode('utf-8')
-                url = services.upload_and_get_url(supabase, html_content, "travel-documents", f"{record_uuid}/cover_letter.html", "text/html")
-                if url: document_urls['html_cover_letter_url'] = url
-
-        if document_urls:
-            st.success("✅ Documents generated and uploaded!")
-            
-            # --- PREPARE RECORD FOR DATABASE ---
-            db_record = form_data.copy()
-            del db_record['selected_hotels_per_trip']
-            
-            serializable_trips = []
-            for trip in db_record['trips']:
-                trip_copy = trip.copy()
-                trip_copy['arrival_date'] = str(trip['arrival_date'])
-                trip_copy['departure_date'] = str(trip['departure_date'])
-                serializable_trips.append(trip_copy)
-            
-            db_record['trips'] = serializable_trips
-            db_record.update(document_urls)
-
-            try:
-                supabase.table("travel_records").insert(db_record).execute()
-                st.subheader("Your Permanent Document Links:")
-                for name, url in document_urls.items():
-                    st.markdown(f"📄 **{name.replace('_', ' ').title()}:** [View/Download Here]({url})")
-            except Exception as e:
-                st.error(f"Database error: {e}")
-        else:
-            st.warning("No documents were selected or generated.")
+        selected_documents = {
+            'pdf_flight_ticket': wants_pdf_flight, 'pdf_hotel_booking': wants_pdf_hotel,
+            'pdf_itinerary': wants_pdf_itinerary, 'pdf_cover_letter': wants_pdf_cover,
+            'html_flight': wants_html_flight, 'html_hotel': wants_html_hotel,
+            'html_itinerary': wants_html_itinerary, 'html_cover_letter': wants_html_cover,
+        }
+        # Workers run the renders, cover letter, uploads and insert; the session only polls the job,
+        # so a dropped connection loses nothing. The job id is the record uuid, so a retry reuses it.
+        job_id, accepted = jobs.enqueue({
+            'form_data': form_data, 'polish_cover_letter': polish_cover_letter, 'bundle_pdfs': bundle_pdfs,
+            'documents': [name for name, wanted in selected_documents.items() if wanted],
+        }, job_id=record_uuid)
+        if not accepted:
+            st.warning("The previous generation for this record is still in progress; this submission was not queued. "
+                       "Wait for it to finish, then submit again.")
+        st.session_state.active_job = job_id
+        st.query_params['job'] = job_id
+
+# --- JOB PROGRESS & RESULTS ---
+# The job id is also kept in the URL, so a reload picks the job up again.
+active_job = st.session_state.get('active_job') or st.query_params.get('job')
+if active_job:
+    job = jobs.get(active_job)
+    if job is None:
+        st.warning("That generation job no longer exists.")
+    elif not job.finished:
+        ui_components.display_job_progress(jobs, active_job)
+    else:
+        if job.status == job_queue.DONE and st.session_state.get('pending_record_uuid') == job.id:
+            del st.session_state.pending_record_uuid, st.session_state.pending_record_fingerprint
+            del st.session_state.pending_record_created_at
+            record_history.default_browser.invalidate()
+        ui_components.display_job_result(job)
 
 # --- DISPLAY PAST RECORDS FROM MODULE ---
 ui_components.display_past_records(supabase)
\ No newline at end of file
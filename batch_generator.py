@@ -0,0 +1,205 @@
+"""Headless batch generation: renders documents for every form_data record in a JSONL file.
+
+Usage:
+    python batch_generator.py records.jsonl --out output/ --workers 8
+    python batch_generator.py records.jsonl --out output/ --bucket travel-documents   # upload instead of writing files
+
+Completed record uuids are appended to a checkpoint file, so re-running the same command
+after a crash resumes where the previous run stopped.
+"""
+import argparse
+import concurrent.futures
+import datetime
+import json
+import os
+import sys
+import uuid
+
+import document_cache
+import html_generator
+import pdf_generator
+import services
+from itinerary import Itinerary
+
+# --- DOCUMENT TYPES ---
+
+# name -> (generator, file name, content type, needs a selected hotel)
+DOCUMENT_TYPES = {
+    'pdf_flight_ticket': (pdf_generator.create_flight_ticket_pdf, 'flight.pdf', 'application/pdf', False),
+    'pdf_hotel_booking': (pdf_generator.create_hotel_booking_pdf, 'hotel.pdf', 'application/pdf', True),
+    'pdf_itinerary': (pdf_generator.create_itinerary_pdf, 'itinerary.pdf', 'application/pdf', False),
+    'pdf_cover_letter': (pdf_generator.create_cover_letter_pdf, 'cover_letter.pdf', 'application/pdf', False),
+    'html_flight': (html_generator.create_flight_ticket_html, 'flight.html', 'text/html', False),
+    'html_hotel': (html_generator.create_hotel_booking_html, 'hotel.html', 'text/html', True),
+    'html_itinerary': (html_generator.create_itinerary_html, 'itinerary.html', 'text/html', False),
+    'html_cover_letter': (html_generator.create_cover_letter_html, 'cover_letter.html', 'text/html', False),
+    'pdf_visa_pack': (pdf_generator.create_visa_pack_pdf, 'visa_pack.pdf', 'application/pdf', False),
+}
+# Rendered from the cover letter text (which carries today's date) rather than the record, so the
+# document cache keys on the text, as in submission.py.
+COVER_LETTER_DOCUMENTS = {'pdf_cover_letter', 'html_cover_letter'}
+
+# --- RECORD PARSING ---
+
+def _parse_trip(trip: dict) -> dict:
+    trip = dict(trip)
+    for key in ('arrival_date', 'departure_date'):
+        if isinstance(trip.get(key), str):
+            trip[key] = datetime.date.fromisoformat(trip[key][:10])
+    return trip
+
+def parse_form_data(record: dict) -> dict:
+    """Converts a JSON form_data record (ISO date strings) into the shape the generators expect."""
+    form_data = dict(record)
+    form_data['trips'] = [_parse_trip(t) for t in record.get('trips', [])]
+    form_data['selected_hotels_per_trip'] = [
+        {'trip_data': _parse_trip(stay['trip_data']), 'hotel_data': stay['hotel_data']}
+        for stay in record.get('selected_hotels_per_trip', [])
+    ]
+    return form_data
+
+def iter_records(path: str):
+    """Streams (line number, record) pairs from a JSONL file without loading it into memory."""
+    with open(path, encoding='utf-8') as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            # Records without a uuid get a stable one derived from their content, so resume still works.
+            record.setdefault('uuid', str(uuid.uuid5(uuid.NAMESPACE_URL, line)))
+            yield line_no, record
+
+# --- WORKER ---
+
+_worker_config = {}
+
+def _init_worker(output_dir: str | None, bucket: str | None, cache_dir: str | None = None):
+    _worker_config.update(output_dir=output_dir, bucket=bucket, supabase=None,
+                          cache=document_cache.DocumentCache(directory=cache_dir) if cache_dir else None)
+
+def _store(record_uuid: str, file_name: str, content: bytes, content_type: str) -> str | None:
+    """Writes one document to the output directory or uploads it to the storage bucket."""
+    if _worker_config['bucket']:
+        if _worker_config['supabase'] is None:
+            _worker_config['supabase'] = services.create_supabase_client(services.Settings.from_env())
+        path = f"{record_uuid}/{file_name}"
+        if content_type == 'text/html' and services.PRECOMPRESSED_VARIANTS:
+            return services.upload_precompressed(_worker_config['supabase'], content, services.compress_variants(content),
+                                                 _worker_config['bucket'], path, content_type)
+        return services.upload_file(_worker_config['supabase'], content, _worker_config['bucket'], path, content_type)
+    path = _output_path(record_uuid, file_name)
+    with open(path, 'wb') as f:
+        f.write(content)
+    return path
+
+def _output_path(record_uuid: str, file_name: str) -> str:
+    record_dir = os.path.join(_worker_config['output_dir'], record_uuid)
+    os.makedirs(record_dir, exist_ok=True)
+    return os.path.join(record_dir, file_name)
+
+def render_record(record: dict, document_types: list[str]) -> dict:
+    """Renders and stores the requested documents for one record; returns name -> path/URL."""
+    form_data = parse_form_data(record)
+    itinerary = Itinerary.from_form_data(form_data)
+    results = {}
+    cover_letter_text = None
+    for name in document_types:
+        generator, file_name, content_type, needs_hotel = DOCUMENT_TYPES[name]
+        if needs_hotel and not form_data['selected_hotels_per_trip']:
+            continue
+        if (name in COVER_LETTER_DOCUMENTS or name == 'pdf_visa_pack') and cover_letter_text is None:
+            cover_letter_text = services.render_cover_letter_text(form_data, itinerary)
+        if name in COVER_LETTER_DOCUMENTS:
+            source, kwargs = cover_letter_text, {}
+        elif name == 'pdf_visa_pack':
+            source, kwargs = {**form_data, 'cover_letter_text': cover_letter_text}, {'itinerary': itinerary}
+        else:
+            source, kwargs = form_data, {'itinerary': itinerary}
+        cache = _worker_config['cache']
+        if not cache and not _worker_config['bucket']:
+            # Written straight into the output file instead of through a bytes copy of the document.
+            path = _output_path(form_data['uuid'], file_name)
+            with open(path, 'wb') as f:
+                generator(source, sink=f, **kwargs)
+            results[f"{name}_url"] = path
+            continue
+        content = cache.render(generator, source, **kwargs) if cache else generator(source, **kwargs)
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        location = _store(form_data['uuid'], file_name, content, content_type)
+        if not location:
+            # Fail the whole record so it is not checkpointed and gets retried on resume.
+            raise RuntimeError(f"Could not store {file_name} for record {form_data['uuid']}")
+        results[f"{name}_url"] = location
+    return results
+
+# --- CHECKPOINTING ---
+
+def load_checkpoint(path: str) -> set:
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding='utf-8') as f:
+        return {line.strip() for line in f if line.strip()}
+
+# --- DRIVER ---
+
+def run_batch(input_path: str, output_dir: str, document_types: list[str], workers: int,
+              bucket: str | None = None, cache_dir: str | None = None) -> dict:
+    """Fans records out across a process pool, keeping a bounded number in flight. Returns run counters."""
+    os.makedirs(output_dir, exist_ok=True)
+    checkpoint_path = os.path.join(output_dir, 'checkpoint.txt')
+    done = load_checkpoint(checkpoint_path)
+    counters = {'rendered': 0, 'skipped': 0, 'failed': 0}
+    max_pending = workers * 4
+
+    with open(checkpoint_path, 'a', encoding='utf-8') as checkpoint, \
+         open(os.path.join(output_dir, 'manifest.jsonl'), 'a', encoding='utf-8') as manifest, \
+         open(os.path.join(output_dir, 'errors.jsonl'), 'a', encoding='utf-8') as errors, \
+         concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(output_dir, bucket, cache_dir)) as pool:
+        pending = {}
+
+        def drain(return_when):
+            finished, _ = concurrent.futures.wait(pending, return_when=return_when)
+            for future in finished:
+                line_no, record_uuid = pending.pop(future)
+                try:
+                    urls = future.result()
+                except Exception as e:
+                    counters['failed'] += 1
+                    errors.write(json.dumps({'line': line_no, 'uuid': record_uuid, 'error': repr(e)}) + '\n')
+                    continue
+                counters['rendered'] += 1
+                manifest.write(json.dumps({'uuid': record_uuid, **urls}) + '\n')
+                checkpoint.write(record_uuid + '\n')
+            checkpoint.flush(); manifest.flush(); errors.flush()
+
+        for line_no, record in iter_records(input_path):
+            if record['uuid'] in done:
+                counters['skipped'] += 1
+                continue
+            future = pool.submit(render_record, record, document_types)
+            pending[future] = (line_no, record['uuid'])
+            if len(pending) >= max_pending:
+                drain(concurrent.futures.FIRST_COMPLETED)
+        if pending:
+            drain(concurrent.futures.ALL_COMPLETED)
+    return counters
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate travel documents for every record in a JSONL file.")
+    parser.add_argument('input', help="JSONL file with one form_data record per line")
+    parser.add_argument('--out', default='batch_output', help="Output directory (also holds checkpoint and manifest)")
+    parser.add_argument('--documents', nargs='+', choices=sorted(DOCUMENT_TYPES),
+                        default=sorted(set(DOCUMENT_TYPES) - {'pdf_visa_pack'}), help="Default: every document except the visa pack")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--bucket', help="Upload to this Supabase storage bucket (SUPABASE_URL/SUPABASE_KEY from env) instead of writing files")
+    parser.add_argument('--cache-dir', help="Content-addressed document cache shared by all workers and runs")
+    args = parser.parse_args(argv)
+
+    counters = run_batch(args.input, args.out, args.documents, args.workers, args.bucket, args.cache_dir)
+    print(f"rendered={counters['rendered']} skipped={counters['skipped']} failed={counters['failed']}")
+    return 1 if counters['failed'] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
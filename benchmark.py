@@ -0,0 +1,257 @@
+"""Benchmarks every document generator against synthetic form_data of growing size.
+
+Usage:
+    python benchmark.py run --out baseline.json                # full sweep
+    python benchmark.py run --quick --out current.json         # smaller sweep for a quick check
+    python benchmark.py compare baseline.json current.json     # exits 1 if anything regressed
+    python benchmark.py imports --out imports.json             # cold-start import time per entry point
+
+Each axis (trips, passengers, hotel stays, cover letter length) is swept on its own from a small
+base booking, plus a combined group booking, since that is where renders fall over.
+"""
+import argparse
+import datetime
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+import uuid
+
+import fpdf
+
+import html_generator
+import pdf_generator
+
+# --- SYNTHETIC WORKLOAD ---
+
+COUNTRIES = ('France', 'Germany', 'Italy', 'Spain', 'USA', 'Dubai')
+GENDERS = ('Male', 'Female', 'Other')
+
+def make_form_data(trips: int = 2, passengers: int = 2, stays: int = 1, seed: int = 0) -> dict:
+    """Builds a form_data record shaped like the app's, with `passengers` travellers in total."""
+    rng = random.Random(seed)
+    start = datetime.date(2030, 1, 1)
+    trip_list = []
+    for i in range(trips):
+        arrival = start + datetime.timedelta(days=5 * i)
+        trip_list.append({
+            'country': COUNTRIES[i % len(COUNTRIES)], 'arrival_date': arrival, 'departure_date': arrival + datetime.timedelta(days=4),
+            'airline': 'Travaky Airlines', 'pnr': f"{rng.randrange(16**6):06X}", 'flight_no': f"TVK-{100 + i}",
+            'ticket_no': f"180-{rng.randrange(10**10):010d}", 'dep_time': '10:30', 'arr_time': '18:45',
+        })
+    hotels = [
+        {'trip_data': trip_list[i % trips], 'hotel_data': {'Hotel Name': f"Hotel {i}", 'City': f"City {i}", 'Country': trip_list[i % trips]['country'], 'Rate': 80 + i}}
+        for i in range(stays if trips else 0)
+    ]
+    return {
+        'uuid': str(uuid.UUID(int=rng.getrandbits(128))), 'passenger_name': 'Alex Benchmark', 'age': 35, 'gender': 'Other',
+        'hometown': 'New York', 'passport_number': 'X1234567', 'phone_number': '+1-555-0100', 'flight_cost': 650.0,
+        'job_title': 'Engineer', 'company_name': 'Acme Corp', 'joining_date': '2020-01-01',
+        'family_members': [{'name': f"Guest {i}", 'age': 30, 'gender': GENDERS[i % 3]} for i in range(max(0, passengers - 1))],
+        'trips': trip_list, 'selected_hotels_per_trip': hotels,
+        'selected_hotel': ", ".join(h['hotel_data']['Hotel Name'] for h in hotels),
+    }
+
+def make_cover_letter(paragraphs: int = 4) -> str:
+    """A cover letter with `paragraphs` body paragraphs."""
+    body = ("I am writing to apply for a Schengen visa to attend meetings and visit the region. "
+            "I will cover all expenses and return to my position at the end of the trip. ") * 3
+    return "To the Visa Officer,\n\n" + "\n\n".join([body] * paragraphs) + "\n\nYours sincerely,\nAlex Benchmark"
+
+# name -> (generator, input kind); form generators take form_data, letter generators take text.
+GENERATORS = {
+    'pdf_flight_ticket': (pdf_generator.create_flight_ticket_pdf, 'form'),
+    'pdf_hotel_booking': (pdf_generator.create_hotel_booking_pdf, 'form'),
+    'pdf_itinerary': (pdf_generator.create_itinerary_pdf, 'form'),
+    'pdf_cover_letter': (pdf_generator.create_cover_letter_pdf, 'letter'),
+    'html_flight': (html_generator.create_flight_ticket_html, 'form'),
+    'html_hotel': (html_generator.create_hotel_booking_html, 'form'),
+    'html_itinerary': (html_generator.create_itinerary_html, 'form'),
+    'html_cover_letter': (html_generator.create_cover_letter_html, 'letter'),
+    'pdf_visa_pack': (pdf_generator.create_visa_pack_pdf, 'form'),
+}
+
+BASE_CASE = {'trips': 2, 'passengers': 2, 'stays': 1}
+SWEEPS = {
+    'trips': (1, 5, 20, 50, 100, 200),
+    'passengers': (1, 10, 50, 100, 200, 300),
+    'stays': (0, 1, 5, 20, 50),
+    'paragraphs': (1, 4, 16, 64),
+}
+QUICK_SWEEPS = {
+    'trips': (1, 20),
+    'passengers': (1, 50),
+    'stays': (1, 10),
+    'paragraphs': (4, 16),
+}
+GROUP_CASE = {'trips': 20, 'passengers': 300, 'stays': 20}
+
+def iter_cases(quick: bool = False):
+    """Yields (case name, generator names, input) for every point of the sweep."""
+    sweeps = QUICK_SWEEPS if quick else SWEEPS
+    form_generators = [n for n, (_, kind) in GENERATORS.items() if kind == 'form']
+    letter_generators = [n for n, (_, kind) in GENERATORS.items() if kind == 'letter']
+    for axis in ('trips', 'passengers', 'stays'):
+        for value in sweeps[axis]:
+            params = {**BASE_CASE, axis: value}
+            yield f"{axis}={value}", form_generators, make_form_data(**params)
+    yield "group", form_generators, make_form_data(**GROUP_CASE)
+    for value in sweeps['paragraphs']:
+        yield f"paragraphs={value}", letter_generators, make_cover_letter(value)
+
+# --- MEASUREMENT ---
+
+def percentile(samples: list, q: float) -> float:
+    """Nearest-rank percentile of `samples` (0 < q <= 100)."""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+def measure(generator, source, repeat: int, time_budget: float) -> dict:
+    """Times `repeat` renders (fewer if they exceed `time_budget` seconds), then one traced render for peak memory."""
+    output = generator(source)  # Warm-up; also primes per-process layout caches.
+    samples, started = [], time.perf_counter()
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        generator(source)
+        samples.append((time.perf_counter() - t0) * 1000)
+        if time.perf_counter() - started > time_budget:
+            break
+
+    tracemalloc.start()
+    try:
+        generator(source)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    size = len(output.encode('utf-8') if isinstance(output, str) else output)
+    return {
+        'runs': len(samples), 'p50_ms': percentile(samples, 50), 'p95_ms': percentile(samples, 95),
+        'p99_ms': percentile(samples, 99), 'max_ms': max(samples), 'peak_kib': peak / 1024, 'size_bytes': size,
+    }
+
+def run_benchmarks(generators: list[str], repeat: int = 20, time_budget: float = 5.0, quick: bool = False, log=None) -> dict:
+    """Runs the sweep for the selected generators; returns the baseline document."""
+    results = {}
+    for case, names, source in iter_cases(quick):
+        for name in names:
+            if name not in generators:
+                continue
+            stats = measure(GENERATORS[name][0], source, repeat, time_budget)
+            results[f"{name}|{case}"] = stats
+            if log:
+                log(f"{name:<18} {case:<16} p50={stats['p50_ms']:9.2f}ms p95={stats['p95_ms']:9.2f}ms "
+                    f"peak={stats['peak_kib']:10.1f}KiB size={stats['size_bytes']:>10,}B")
+    return {
+        'meta': {
+            'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(), 'platform': platform.platform(), 'fpdf2': fpdf.__version__,
+            'repeat': repeat, 'quick': quick,
+        },
+        'results': results,
+    }
+
+# --- IMPORT TIME ---
+
+# What a batch worker, the submission pipeline and the UI each import on a cold start;
+# streamlit alone is the reference for what the headless modules must not pull in.
+IMPORT_TARGETS = ('services', 'submission', 'batch_generator', 'html_generator', 'pdf_generator', 'app_stack', 'streamlit')
+IMPORT_STATEMENTS = {'app_stack': 'import streamlit, supabase, groq, submission'}
+
+def measure_import(target: str, repeat: int = 7) -> dict:
+    """Median wall time of importing `target` in a fresh interpreter, minus the bare interpreter start-up."""
+    def cold_start(code):
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+            samples.append((time.perf_counter() - started) * 1000)
+        return samples
+    baseline = percentile(cold_start('pass'), 50)
+    samples = [max(0.0, t - baseline) for t in cold_start(IMPORT_STATEMENTS.get(target, f'import {target}'))]
+    modules = subprocess.run([sys.executable, '-c', f"{IMPORT_STATEMENTS.get(target, f'import {target}')}; import sys; print(len(sys.modules), 'streamlit' in sys.modules)"],
+                             check=True, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.split()
+    return {'runs': repeat, 'p50_ms': percentile(samples, 50), 'p95_ms': percentile(samples, 95), 'p99_ms': percentile(samples, 99),
+            'max_ms': max(samples), 'modules': int(modules[0]), 'imports_streamlit': modules[1] == 'True'}
+
+# --- COMPARISON ---
+
+# metric -> minimum absolute change that counts, so sub-millisecond noise is not reported.
+COMPARED_METRICS = {'p50_ms': 0.5, 'p95_ms': 1.0, 'peak_kib': 64, 'size_bytes': 1024}
+
+def compare(baseline: dict, current: dict, threshold: float = 0.10) -> list[dict]:
+    """Lists every metric that grew by more than `threshold` (relative) between two runs."""
+    regressions = []
+    for key, now in current['results'].items():
+        before = baseline['results'].get(key)
+        if before is None:
+            continue
+        for metric, min_delta in COMPARED_METRICS.items():
+            if metric not in before or metric not in now:
+                continue
+            old, new = before[metric], now[metric]
+            if new - old > min_delta and new > old * (1 + threshold):
+                regressions.append({'case': key, 'metric': metric, 'baseline': old, 'current': new,
+                                    'change': (new / old - 1) if old else float('inf')})
+    return regressions
+
+# --- CLI ---
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the PDF and HTML document generators.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="Run the sweep and write the results as JSON")
+    run_parser.add_argument('--out', default='benchmark_results.json')
+    run_parser.add_argument('--generators', nargs='+', choices=sorted(GENERATORS), default=sorted(GENERATORS))
+    run_parser.add_argument('--repeat', type=int, default=20, help="Timed renders per case")
+    run_parser.add_argument('--time-budget', type=float, default=5.0, help="Stop repeating a case after this many seconds")
+    run_parser.add_argument('--quick', action='store_true', help="Use a reduced sweep")
+
+    imports_parser = commands.add_parser('imports', help="Measure cold-start import time of each entry point")
+    imports_parser.add_argument('--out', help="Also write the results as JSON (comparable with 'compare')")
+    imports_parser.add_argument('--repeat', type=int, default=7)
+
+    compare_parser = commands.add_parser('compare', help="Compare two result files and flag regressions")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.10, help="Relative growth that counts as a regression")
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        report = run_benchmarks(args.generators, args.repeat, args.time_budget, args.quick, log=print)
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"Wrote {len(report['results'])} results to {args.out}")
+        return 0
+
+    if args.command == 'imports':
+        results = {}
+        for target in IMPORT_TARGETS:
+            stats = results[f"import|{target}"] = measure_import(target, args.repeat)
+            print(f"{target:<16} p50={stats['p50_ms']:8.1f}ms modules={stats['modules']:5d} streamlit={'yes' if stats['imports_streamlit'] else 'no'}")
+        if args.out:
+            with open(args.out, 'w', encoding='utf-8') as f:
+                json.dump({'meta': {'python': platform.python_version(), 'repeat': args.repeat}, 'results': results}, f, indent=2, sort_keys=True)
+        return 0
+
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(args.current, encoding='utf-8') as f:
+        current = json.load(f)
+    regressions = compare(baseline, current, args.threshold)
+    for r in regressions:
+        print(f"REGRESSION {r['case']:<40} {r['metric']:<10} {r['baseline']:12.2f} -> {r['current']:12.2f} ({r['change']:+.0%})")
+    missing = sorted(set(baseline['results']) - set(current['results']))
+    if missing:
+        print(f"{len(missing)} baseline case(s) not in the current run, e.g. {missing[0]}")
+    print(f"{len(regressions)} regression(s) across {len(set(baseline['results']) & set(current['results']))} shared cases")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+import collections
+import hashlib
+import importlib.metadata
+import inspect
+import json
+import os
+import sys
+import threading
+
+# --- CACHE KEYS ---
+
+# The form_data fields each generator actually reads. Anything not listed here cannot change
+# the output, so it is left out of the key (e.g. passport number for the itinerary).
+GENERATOR_INPUTS = {
+    'create_flight_ticket_pdf': ('uuid', 'created_at', 'passenger_name', 'hometown', 'family_members', 'trips', 'flight_cost'),
+    'create_hotel_booking_pdf': ('uuid', 'created_at', 'passenger_name', 'family_members', 'selected_hotels_per_trip'),
+    'create_itinerary_pdf': ('uuid', 'created_at', 'passenger_name', 'hometown', 'trips'),
+    'create_flight_ticket_html': ('passenger_name', 'gender', 'hometown', 'family_members', 'trips', 'flight_cost'),
+    'create_hotel_booking_html': ('passenger_name', 'family_members', 'selected_hotels_per_trip'),
+    'create_itinerary_html': ('passenger_name', 'hometown', 'trips'),
+    'create_visa_pack_pdf': ('uuid', 'created_at', 'passenger_name', 'hometown', 'family_members', 'trips', 'flight_cost',
+                             'selected_hotels_per_trip', 'cover_letter_text', 'visa_pack_sections'),
+}
+
+# Keyword arguments computed from the data itself; every other keyword argument is part of the key.
+DERIVED_ARGUMENTS = {'itinerary'}
+
+# Besides its own module, what each generator module's output depends on: the repo modules it
+# renders through, the libraries whose version changes the bytes, and its module-level settings.
+CODE_DEPENDENCIES = {
+    'pdf_generator': ('pdf_barcodes', 'itinerary'),
+    'html_generator': ('html_templates', 'itinerary'),
+}
+LIBRARY_DEPENDENCIES = {
+    'pdf_generator': ('fpdf2', 'pikepdf'),
+}
+RENDER_SETTINGS = {
+    'pdf_generator': ('LINEARIZE',),
+}
+
+_module_fingerprints = {}
+
+def _source_hash(module_name: str) -> str:
+    try:
+        source = inspect.getsource(sys.modules[module_name])
+    except (OSError, TypeError, KeyError):
+        source = module_name
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()[:16]
+
+def _library_version(distribution: str) -> str | None:
+    try:
+        return importlib.metadata.version(distribution)
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+def _module_fingerprint(generator) -> str:
+    """Hash of the code and library versions behind the generator's module, so stored documents are
+    invalidated when any of them changes."""
+    module_name = generator.__module__
+    if module_name not in _module_fingerprints:
+        parts = [_source_hash(name) for name in (module_name, *CODE_DEPENDENCIES.get(module_name, ()))]
+        parts += [f"{name}={_library_version(name)}" for name in LIBRARY_DEPENDENCIES.get(module_name, ())]
+        _module_fingerprints[module_name] = hashlib.sha256("|".join(parts).encode('utf-8')).hexdigest()[:16]
+    return _module_fingerprints[module_name]
+
+def _render_settings(generator) -> dict:
+    """The generator module's output-affecting settings; read on every call as they can be switched at runtime."""
+    module = sys.modules.get(generator.__module__)
+    return {name: getattr(module, name, None) for name in RENDER_SETTINGS.get(generator.__module__, ())}
+
+def cache_key(generator, data, options: dict | None = None) -> str:
+    """Canonical content hash of the generator identity, the inputs it reads and its keyword options."""
+    fields = GENERATOR_INPUTS.get(generator.__name__)
+    inputs = {field: data.get(field) for field in fields} if fields and isinstance(data, dict) else data
+    options = {k: v for k, v in (options or {}).items() if k not in DERIVED_ARGUMENTS}
+    canonical = json.dumps(
+        {'generator': generator.__qualname__, 'code': _module_fingerprint(generator), 'settings': _render_settings(generator),
+         'inputs': inputs, 'options': options},
+        sort_keys=True, separators=(',', ':'), default=str,
+    )
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+# --- CACHE ---
+
+class DocumentCache:
+    """Two-level (in-memory LRU, then on-disk) content-addressed store for rendered documents."""
+
+    def __init__(self, max_items: int = 256, directory: str | None = None):
+        self.max_items = max_items
+        self.directory = directory
+        self._items = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key: str):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key]
+        if self.directory and os.path.exists(self._path(key)):
+            with open(self._path(key), 'rb') as f:
+                stored = f.read()
+            # First byte records whether the generator returned text or bytes.
+            value = stored[1:].decode('utf-8') if stored[:1] == b's' else stored[1:]
+            self._remember(key, value)
+            self.hits += 1
+            return value
+        self.misses += 1
+        return None
+
+    def put(self, key: str, value):
+        self._remember(key, value)
+        if self.directory:
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            payload = b's' + value.encode('utf-8') if isinstance(value, str) else b'b' + bytes(value)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+
+    def _remember(self, key: str, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def render(self, generator, data, *args, **kwargs):
+        """Returns the stored document for (generator, data) or renders and stores it."""
+        key = cache_key(generator, data, kwargs)
+        value = self.get(key)
+        if value is None:
+            value = generator(data, *args, **kwargs)
+            self.put(key, value)
+        return value
+
+# Process-wide cache used by the app; set TRAVAKY_CACHE_DIR to also keep documents on disk.
+default_cache = DocumentCache(directory=os.environ.get('TRAVAKY_CACHE_DIR'))
+
+def render(generator, data, *args, **kwargs):
+    """Renders through the process-wide cache."""
+    return default_cache.render(generator, data, *args, **kwargs)
@@ -0,0 +1,215 @@
+import bisect
+import difflib
+import json
+import os
+import threading
+import time
+import types
+
+# --- LOOKUP INDEX ---
+
+def normalize_location(name: str | None) -> str:
+    """Case- and whitespace-insensitive form of a city or country name."""
+    return " ".join((name or "").casefold().split())
+
+class HotelIndex:
+    """Immutable lookup of hotels by normalized city and country name, built once per catalogue version."""
+    __slots__ = ('_by_location', '_locations')
+
+    def __init__(self, hotels):
+        by_location = {}
+        for hotel in hotels:
+            # A hotel whose city and country normalize to the same name is listed once.
+            for location in dict.fromkeys((normalize_location(hotel.get('City')), normalize_location(hotel.get('Country')))):
+                if location:
+                    by_location.setdefault(location, []).append(hotel)
+        self._by_location = types.MappingProxyType({k: tuple(v) for k, v in by_location.items()})
+        self._locations = tuple(sorted(by_location))
+
+    def lookup(self, location: str) -> tuple:
+        """Hotels whose city or country is exactly `location`."""
+        return self._by_location.get(normalize_location(location), ())
+
+    def prefix(self, text: str) -> tuple:
+        """Hotels in every city/country starting with `text`, e.g. "par" -> Paris."""
+        text = normalize_location(text)
+        if not text:
+            return ()
+        start = bisect.bisect_left(self._locations, text)
+        end = bisect.bisect_left(self._locations, text + "\uffff", lo=start)
+        return self._merge(self._locations[start:end])
+
+    def fuzzy(self, text: str, limit: int = 3, cutoff: float = 0.75) -> tuple:
+        """Hotels in the cities/countries closest to `text`, for typos like "Pariss"."""
+        text = normalize_location(text)
+        if not text:
+            return ()
+        return self._merge(difflib.get_close_matches(text, self._locations, n=limit, cutoff=cutoff))
+
+    def search(self, text: str) -> tuple:
+        """Exact matches if there are any, otherwise prefix matches, otherwise fuzzy matches."""
+        return self.lookup(text) or self.prefix(text) or self.fuzzy(text)
+
+    def _merge(self, locations) -> tuple:
+        seen, merged = set(), []
+        for location in locations:
+            for hotel in self._by_location[location]:
+                if id(hotel) not in seen:
+                    seen.add(id(hotel)); merged.append(hotel)
+        return tuple(merged)
+
+# --- CATALOGUE ---
+
+# Only the columns the UI and the generators read.
+HOTEL_COLUMNS = ("Hotel Name", "City", "Country", "Rate")
+# PostgREST error codes for a column the table does not have (on select, and from its schema cache).
+MISSING_COLUMN_CODES = ("42703", "PGRST204")
+
+def _select_clause(columns) -> str:
+    return ",".join(f'"{c}"' if " " in c else c for c in columns)
+
+class HotelCatalogue:
+    """Process-wide, TTL-cached copy of the hotel_attraction_list table.
+
+    Refreshes fetch only rows changed since the last sync (by `updated_column`, merged on
+    `key_column`) and fall back to a full projected fetch if the table lacks those columns.
+    A JSON snapshot on disk lets a cold start serve hotels immediately while it refreshes."""
+
+    def __init__(self, table: str = "hotel_attraction_list", ttl: float = 300, full_refresh_interval: float = 3600,
+                 snapshot_path: str | None = None, key_column: str = "id", updated_column: str = "updated_at"):
+        self.table, self.ttl, self.full_refresh_interval = table, ttl, full_refresh_interval
+        self.snapshot_path, self.key_column, self.updated_column = snapshot_path, key_column, updated_column
+        self.version = 0
+        self._hotels, self._rows = (), {}
+        self._index = None
+        self._published = (0, ())
+        self._fetched_at = self._full_fetched_at = 0.0
+        self._last_change = None
+        self._incremental = True
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._snapshot_loaded = False
+
+    # --- Public API ---
+
+    def hotels(self, supabase) -> tuple:
+        """Returns the catalogue, refreshing it first if it is older than the TTL.
+
+        A catalogue loaded from the snapshot is returned immediately and refreshed in the background."""
+        if not self._snapshot_loaded:
+            # Read on first use rather than at import, so snapshot_path can still be changed.
+            with self._lock:
+                if not self._snapshot_loaded:
+                    self._load_snapshot()
+                    self._snapshot_loaded = True
+        if time.monotonic() - self._fetched_at < self.ttl:
+            return self._hotels
+        if self._hotels:
+            self._refresh_in_background(supabase)
+            return self._hotels
+        with self._lock:
+            if time.monotonic() - self._fetched_at >= self.ttl:
+                self._refresh(supabase)
+        return self._hotels
+
+    def index(self, supabase) -> HotelIndex:
+        """Returns the lookup index for the current catalogue version, building it only when the version changes."""
+        self.hotels(supabase)
+        version, hotels = self._published  # Read together, so a background refresh can't mix versions.
+        cached = self._index
+        if cached is None or cached[0] != version:
+            cached = (version, HotelIndex(hotels))
+            self._index = cached
+        return cached[1]
+
+    def invalidate(self):
+        self._fetched_at = self._full_fetched_at = 0.0
+
+    # --- Refreshing ---
+
+    def _refresh_in_background(self, supabase):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                with self._lock:
+                    self._refresh(supabase)
+            except Exception:
+                pass  # Keep serving the current copy; the next call past the TTL retries.
+            finally:
+                self._refreshing = False
+        threading.Thread(target=run, name="hotel-catalogue-refresh", daemon=True).start()
+
+    def _refresh(self, supabase):
+        now = time.monotonic()
+        full = not self._incremental or self._last_change is None or now - self._full_fetched_at >= self.full_refresh_interval
+        rows, projected = None, False
+        if self._incremental:
+            try:
+                columns = _select_clause((self.key_column, self.updated_column) + HOTEL_COLUMNS)
+                query = supabase.table(self.table).select(columns)
+                if not full:
+                    query = query.gt(self.updated_column, self._last_change)
+                rows = query.execute().data
+            except Exception as e:
+                # Only a missing key/updated_at column ends change tracking; a timeout or 5xx just
+                # falls back for this refresh.
+                if getattr(e, 'code', None) in MISSING_COLUMN_CODES:
+                    self._incremental = False
+        if rows is None:
+            rows = supabase.table(self.table).select(_select_clause(HOTEL_COLUMNS)).execute().data
+            # These rows carry no key or change time: replace the catalogue, and have the next
+            # incremental refresh fetch everything again to rebuild the keys.
+            projected, full, self._last_change = True, True, None
+
+        if self._incremental and not projected and any(row.get(self.key_column) is None or row.get(self.updated_column) is None for row in rows):
+            # Rows without a key or change time can't be tracked: key every row by position from now on.
+            self._incremental = False
+            if not full:
+                return self._refresh(supabase)
+
+        if full:
+            self._rows = {}
+            self._full_fetched_at = now
+        for index, row in enumerate(rows):
+            tracked = self._incremental and not projected
+            self._rows[row.get(self.key_column, index) if tracked else index] = row
+            if tracked and row.get(self.updated_column) and (self._last_change is None or row[self.updated_column] > self._last_change):
+                self._last_change = row[self.updated_column]
+        self._fetched_at = now
+        if full or rows:
+            self._publish()
+
+    def _publish(self):
+        self._hotels = tuple({c: row.get(c) for c in HOTEL_COLUMNS} for row in self._rows.values())
+        self.version += 1
+        self._published = (self.version, self._hotels)
+        self._save_snapshot()
+
+    # --- Snapshot ---
+
+    def _load_snapshot(self):
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return
+        try:
+            with open(self.snapshot_path, encoding='utf-8') as f:
+                self._hotels = tuple(json.load(f)['hotels'])
+            self.version += 1
+            self._published = (self.version, self._hotels)
+        except (OSError, ValueError, KeyError):
+            self._hotels = ()
+
+    def _save_snapshot(self):
+        if not self.snapshot_path:
+            return
+        os.makedirs(os.path.dirname(self.snapshot_path) or '.', exist_ok=True)
+        tmp_path = f"{self.snapshot_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'hotels': list(self._hotels)}, f)
+        os.replace(tmp_path, self.snapshot_path)
+
+# Shared by every Streamlit session in the process.
+default_catalogue = HotelCatalogue(snapshot_path=os.environ.get('TRAVAKY_HOTEL_SNAPSHOT', os.path.join('.cache', 'hotel_catalogue.json')))
@@ -1,219 +1,295 @@
 import datetime
+import functools
+import hashlib
+import os
 import random
+import re
+import metrics
+from html_templates import Fragment, Markup, Template
+from itinerary import Itinerary
 
-def _get_base_html_template(title: str, body_content: str) -> str:
-    """A base HTML template with a professional 'Ocean Blue' theme."""
-    return f"""
+# --- THEME ---
+
+# 'shared' makes submissions reference one uploaded, content-hashed stylesheet instead of
+# inlining the theme into every document; the default keeps each document self-contained.
+SHARED_STYLESHEET = os.environ.get('TRAVAKY_HTML_STYLESHEET', 'inline') == 'shared'
+
+THEME_NAME = 'ocean-blue'
+THEME_CSS = """\
+:root {
+    --primary-color: #0077b6;  /* Deep Ocean Blue */
+    --secondary-color: #00b4d8; /* Lighter Sky Blue */
+    --accent-color: #90e0ef;   /* Very Light Blue */
+    --background-color: #f0f8ff; /* Alice Blue */
+    --text-color: #343a40;      /* Dark Gray */
+    --card-bg-color: #ffffff;
+}
+body {
+    font-family: 'Poppins', system-ui, -apple-system, 'Segoe UI', Roboto, sans-serif;
+    background-color: var(--background-color);
+    margin: 0;
+    padding: 20px;
+    color: var(--text-color);
+}
+.container {
+    max-width: 850px;
+    margin: 20px auto;
+    background-color: var(--card-bg-color);
+    border-radius: 12px;
+    box-shadow: 0 6px 20px rgba(0, 0, 0, 0.08);
+    overflow: hidden;
+}
+.header {
+    background: linear-gradient(135deg, var(--primary-color), var(--secondary-color));
+    color: white;
+    padding: 30px 25px;
+}
+.header h1 { margin: 0; font-size: 2.2em; font-weight: 600; }
+.header p { margin: 5px 0 0; opacity: 0.9; font-size: 1.1em;}
+.content-section { padding: 30px; border-bottom: 1px solid #e9ecef; }
+.content-section:last-child { border-bottom: none; }
+h2 {
+    font-size: 1.5em;
+    font-weight: 600;
+    color: var(--primary-color);
+    border-bottom: 2px solid var(--accent-color);
+    padding-bottom: 10px;
+    margin-top: 0;
+}
+.info-grid {
+    display: grid;
+    grid-template-columns: repeat(auto-fit, minmax(180px, 1fr));
+    gap: 25px;
+}
+.info-item strong {
+    display: block;
+    color: #555;
+    margin-bottom: 6px;
+    font-size: 0.9em;
+    text-transform: uppercase;
+}
+.info-item span { font-size: 1.1em; }
+.flight-leg, .itinerary-leg {
+    background-color: #f8f9fa;
+    border: 1px solid #dee2e6;
+    border-left: 5px solid var(--secondary-color);
+    border-radius: 8px;
+    padding: 20px;
+    margin-bottom: 20px;
+}
+.flight-path {
+    display: flex;
+    align-items: center;
+    justify-content: space-between;
+    font-size: 1.8em;
+    font-weight: 600;
+    margin: 15px 0;
+}
+.flight-path .airport-code { color: var(--primary-color); }
+.flight-path .arrow { color: var(--secondary-color); font-weight: 300; }
+.cover-letter p { line-height: 1.8; }
+.cover-letter ul { list-style-type: none; padding-left: 20px; }
+.footer { text-align: center; padding: 20px; font-size: 0.8em; color: #aaa; }
+"""
+# Loaded without blocking first paint, and only by documents using the shared stylesheet;
+# until it arrives (or in self-contained documents) text renders in the system font stack.
+FONT_STYLESHEET_URL = "https://fonts.googleapis.com/css2?family=Poppins:wght@300;400;500;600&display=swap"
+
+def _minify_css(css: str) -> str:
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};,])\s*", r"\1", css)
+    return re.sub(r":\s+", ":", css).replace(";}", "}").strip()
+
+THEME_STYLESHEET = _minify_css(THEME_CSS)
+THEME_HASH = hashlib.sha256(THEME_STYLESHEET.encode('utf-8')).hexdigest()[:12]
+# Storage path of the shared stylesheet; a new theme version gets a new path, so it can be cached forever.
+THEME_FILE = f"themes/{THEME_NAME}.{THEME_HASH}.css"
+
+# (selector parts, declarations) per rule of the minified theme.
+_THEME_RULES = [(selector.split(','), body) for selector, body in re.findall(r"([^{}]+)\{([^{}]*)\}", THEME_STYLESHEET)]
+_BASE_CLASSES = {'container', 'footer'}
+
+@functools.lru_cache(maxsize=64)
+def _subset_stylesheet(classes: frozenset) -> str:
+    """The minified theme reduced to the rules whose class selectors all appear in `classes`."""
+    rules = []
+    for parts, body in _THEME_RULES:
+        kept = [part for part in parts if set(re.findall(r"\.([\w-]+)", part)) <= classes]
+        if kept:
+            rules.append(f"{','.join(kept)}{{{body}}}")
+    return "".join(rules)
+
+# --- TEMPLATES ---
+
+# Compiled once at import; the generators only stream values through them.
+
+PAGE = Template("""
     <!DOCTYPE html>
     <html lang="en">
     <head>
         <meta charset="UTF-8">
         <meta name="viewport" content="width=device-width, initial-scale=1.0">
         <title>{title}</title>
-        <style>
-            @import url('https://fonts.googleapis.com/css2?family=Poppins:wght@300;400;500;600&display=swap');
-            :root {{
-                --primary-color: #0077b6;  /* Deep Ocean Blue */
-                --secondary-color: #00b4d8; /* Lighter Sky Blue */
-                --accent-color: #90e0ef;   /* Very Light Blue */
-                --background-color: #f0f8ff; /* Alice Blue */
-                --text-color: #343a40;      /* Dark Gray */
-                --card-bg-color: #ffffff;
-            }}
-            body {{
-                font-family: 'Poppins', sans-serif;
-                background-color: var(--background-color);
-                margin: 0;
-                padding: 20px;
-                color: var(--text-color);
-            }}
-            .container {{
-                max-width: 850px;
-                margin: 20px auto;
-                background-color: var(--card-bg-color);
-                border-radius: 12px;
-                box-shadow: 0 6px 20px rgba(0, 0, 0, 0.08);
-                overflow: hidden;
-            }}
-            .header {{
-                background: linear-gradient(135deg, var(--primary-color), var(--secondary-color));
-                color: white;
-                padding: 30px 25px;
-            }}
-            .header h1 {{ margin: 0; font-size: 2.2em; font-weight: 600; }}
-            .header p {{ margin: 5px 0 0; opacity: 0.9; font-size: 1.1em;}}
-            .content-section {{ padding: 30px; border-bottom: 1px solid #e9ecef; }}
-            .content-section:last-child {{ border-bottom: none; }}
-            h2 {{
-                font-size: 1.5em;
-                font-weight: 600;
-                color: var(--primary-color);
-                border-bottom: 2px solid var(--accent-color);
-                padding-bottom: 10px;
-                margin-top: 0;
-            }}
-            .info-grid {{
-                display: grid;
-                grid-template-columns: repeat(auto-fit, minmax(180px, 1fr));
-                gap: 25px;
-            }}
-            .info-item strong {{
-                display: block;
-                color: #555;
-                margin-bottom: 6px;
-                font-size: 0.9em;
-                text-transform: uppercase;
-            }}
-            .info-item span {{ font-size: 1.1em; }}
-            .flight-leg, .itinerary-leg {{
-                background-color: #f8f9fa;
-                border: 1px solid #dee2e6;
-                border-left: 5px solid var(--secondary-color);
-                border-radius: 8px;
-                padding: 20px;
-                margin-bottom: 20px;
-            }}
-            .flight-path {{
-                display: flex;
-                align-items: center;
-                justify-content: space-between;
-                font-size: 1.8em;
-                font-weight: 600;
-                margin: 15px 0;
-            }}
-            .flight-path .airport-code {{ color: var(--primary-color); }}
-            .flight-path .arrow {{ color: var(--secondary-color); font-weight: 300; }}
-            .cover-letter p {{ line-height: 1.8; }}
-            .cover-letter ul {{ list-style-type: none; padding-left: 20px; }}
-            .footer {{ text-align: center; padding: 20px; font-size: 0.8em; color: #aaa; }}
-        </style>
+        {styles}
     </head>
     <body>
         <div class="container">
-            {body_content}
+            {body}
         </div>
         <div class="footer">
             Generated by Travaky | support@travaky.com
         </div>
     </body>
     </html>
-    """
+    """)
 
-def create_flight_ticket_html(data: dict) -> str:
-    main_passenger, hometown = data.get('passenger_name', 'N/A'), data.get('hometown', 'Home City')
-    all_passengers = [main_passenger] + [p['name'] for p in data.get('family_members', [])]
-    sorted_trips = sorted(data.get('trips', []), key=lambda x: x['arrival_date'])
-    manual_cost = data.get('flight_cost', 0.0) * len(all_passengers)
-    
-    passenger_list = "".join([f"<li>{p['name']} ({p.get('gender', 'N/A')})</li>" for p in [{'name': main_passenger, 'gender': data.get('gender')}] + data.get('family_members', [])])
-    
-    flight_legs_html = ""
-    for i, trip in enumerate(sorted_trips):
-        origin = hometown if i == 0 else sorted_trips[i-1]['country']
-        flight_legs_html += f"""
+SHARED_STYLES = Template(
+    '<link rel="stylesheet" href="{stylesheet_url}">'
+    '<link rel="preconnect" href="https://fonts.gstatic.com" crossorigin>'
+    '<link rel="stylesheet" href="{font_url}" media="print" onload="this.media=\'all\'">'
+)
+
+FLIGHT_LEG = Template("""
         <div class="flight-leg">
-            <h3>{trip.get('airline', 'N/A')}: {origin} to {trip.get('country', 'N/A')}</h3>
+            <h3>{airline}: {leg.origin} to {leg.destination}</h3>
             <div class="flight-path">
-                <span class="airport-code">{origin[:3].upper()}</span>
+                <span class="airport-code">{origin_code}</span>
                 <span class="arrow"> -> </span>
-                <span class="airport-code">{trip.get('country', 'N/A')[:3].upper()}</span>
+                <span class="airport-code">{destination_code}</span>
             </div>
             <div class="info-grid">
-                <div class="info-item"><strong>Date</strong><span>{trip['arrival_date'].strftime('%a, %d %b %Y')}</span></div>
-                <div class="info-item"><strong>Departure</strong><span>{trip.get('dep_time', 'N/A')}</span></div>
-                <div class="info-item"><strong>Arrival</strong><span>{trip.get('arr_time', 'N/A')}</span></div>
-                <div class="info-item"><strong>Flight No.</strong><span>{trip.get('flight_no', 'N/A')}</span></div>
-                <div class="info-item"><strong>PNR</strong><span>{trip.get('pnr', 'N/A')}</span></div>
-                <div class="info-item"><strong>E-Ticket</strong><span>{trip.get('ticket_no', 'N/A')}</span></div>
+                <div class="info-item"><strong>Date</strong><span>{leg.arrival_date:%a, %d %b %Y}</span></div>
+                <div class="info-item"><strong>Departure</strong><span>{leg.dep_time}</span></div>
+                <div class="info-item"><strong>Arrival</strong><span>{leg.arr_time}</span></div>
+                <div class="info-item"><strong>Flight No.</strong><span>{leg.flight_no}</span></div>
+                <div class="info-item"><strong>PNR</strong><span>{leg.pnr}</span></div>
+                <div class="info-item"><strong>E-Ticket</strong><span>{leg.ticket_no}</span></div>
             </div>
         </div>
-        """
-
-    body = f"""
-        <div class="header"><h1>Electronic Ticket</h1><p>{sorted_trips[0].get('airline', 'Travaky Airlines') if sorted_trips else ''}</p></div>
-        <div class="content-section"><h2>Flight Summary</h2>{flight_legs_html}</div>
-        <div class="content-section"><h2>Passengers</h2><ul>{passenger_list}</ul></div>
-        <div class="content-section"><h2>Fare Details</h2><div class="info-grid"><div class="info-item"><strong>Total Fare (USD)</strong><span>$ {manual_cost:,.2f}</span></div></div></div>
-    """
-    return _get_base_html_template("Flight Ticket", body)
-
-def create_hotel_booking_html(data: dict) -> str:
-    selected_stays = data.get('selected_hotels_per_trip', [])
-    num_guests = len([data.get('passenger_name')] + [p['name'] for p in data.get('family_members', [])])
-
-    if not selected_stays: return "<html><body>No hotel selected.</body></html>"
-
-    bookings_html = ""
-    for stay in selected_stays:
-        hotel, trip = stay['hotel_data'], stay['trip_data']
-        check_in, check_out = trip['arrival_date'], trip['departure_date']
-        num_nights = max(1, (check_out - check_in).days)
-        total_cost = float(hotel.get('Rate', 0)) * num_nights * num_guests
-        bookings_html += f"""
+        """)
+PASSENGER = Template("<li>{traveller.name} ({traveller.gender})</li>")
+FLIGHT_TICKET = Template("""
+        <div class="header"><h1>Electronic Ticket</h1><p>{airline}</p></div>
+        <div class="content-section"><h2>Flight Summary</h2>{legs}</div>
+        <div class="content-section"><h2>Passengers</h2><ul>{passengers}</ul></div>
+        <div class="content-section"><h2>Fare Details</h2><div class="info-grid"><div class="info-item"><strong>Total Fare (USD)</strong><span>$ {fare:,.2f}</span></div></div></div>
+    """)
+
+HOTEL_STAY = Template("""
         <div class="content-section">
-            <h2>{hotel['Hotel Name']}</h2>
+            <h2>{stay.hotel_name}</h2>
             <div class="info-grid">
-                <div class="info-item"><strong>Location</strong><span>{hotel['City']}, {hotel['Country']}</span></div>
-                <div class="info-item"><strong>Check-in</strong><span>{check_in.strftime('%a, %d %b %Y')}</span></div>
-                <div class="info-item"><strong>Check-out</strong><span>{check_out.strftime('%a, %d %b %Y')}</span></div>
-                <div class="info-item"><strong>Total Nights</strong><span>{num_nights}</span></div>
-                <div class="info-item"><strong>Guests</strong><span>{num_guests}</span></div>
-                <div class="info-item"><strong>Total Cost (EUR)</strong><span>{total_cost:,.2f}</span></div>
+                <div class="info-item"><strong>Location</strong><span>{stay.city}, {stay.country}</span></div>
+                <div class="info-item"><strong>Check-in</strong><span>{stay.check_in:%a, %d %b %Y}</span></div>
+                <div class="info-item"><strong>Check-out</strong><span>{stay.check_out:%a, %d %b %Y}</span></div>
+                <div class="info-item"><strong>Total Nights</strong><span>{stay.nights}</span></div>
+                <div class="info-item"><strong>Guests</strong><span>{stay.guests}</span></div>
+                <div class="info-item"><strong>Total Cost (EUR)</strong><span>{stay.total_cost:,.2f}</span></div>
             </div>
         </div>
-        """
-    body = f"""
+        """)
+HOTEL_BOOKING = Template("""
         <div class="header" style="background: linear-gradient(135deg, #005f73, #0a9396);"><h1>Booking Confirmed!</h1><p>Your hotel reservations are complete.</p></div>
-        {bookings_html}
-    """
-    return _get_base_html_template("Hotel Confirmation", body)
+        {stays}
+    """)
 
-def create_itinerary_html(data: dict) -> str:
-    main_passenger, hometown = data.get('passenger_name', 'N/A'), data.get('hometown', 'Home City')
-    sorted_trips = sorted(data.get('trips', []), key=lambda x: x['arrival_date'])
-    
-    legs_html = ""
-    for i, trip in enumerate(sorted_trips):
-        origin = hometown if i == 0 else sorted_trips[i-1]['country']
-        legs_html += f"""
+ITINERARY_LEG = Template("""
         <div class="itinerary-leg">
             <div class="info-grid">
-                <div class="info-item"><strong>Date</strong><span>{trip['arrival_date'].strftime('%d %b %Y')}</span></div>
-                <div class="info-item"><strong>Route</strong><span>{origin}-> {trip['country']}</span></div>
-                <div class="info-item"><strong>Airline</strong><span>{trip.get('airline', 'N/A')}</span></div>
-                <div class="info-item"><strong>Flight No.</strong><span>{trip.get('flight_no', 'N/A')}</span></div>
+                <div class="info-item"><strong>Date</strong><span>{leg.arrival_date:%d %b %Y}</span></div>
+                <div class="info-item"><strong>Route</strong><span>{leg.origin}-> {leg.destination}</span></div>
+                <div class="info-item"><strong>Airline</strong><span>{airline}</span></div>
+                <div class="info-item"><strong>Flight No.</strong><span>{leg.flight_no}</span></div>
             </div>
         </div>
-        """
-    body = f"""
-        <div class="header" style="background: linear-gradient(135deg, #3d5a80, #98c1d9);"><h1>Travel Itinerary</h1><p>Prepared for {main_passenger}</p></div>
-        <div class="content-section"><h2>Your Journey</h2>{legs_html}</div>
-    """
-    return _get_base_html_template("Travel Itinerary", body)
-
-def create_cover_letter_html(text: str) -> str:
+        """)
+ITINERARY = Template("""
+        <div class="header" style="background: linear-gradient(135deg, #3d5a80, #98c1d9);"><h1>Travel Itinerary</h1><p>Prepared for {passenger_name}</p></div>
+        <div class="content-section"><h2>Your Journey</h2>{legs}</div>
+    """)
+
+DOCUMENT_LIST = Template("""
+        <p>Please find below the list of documents enclosed with this application:</p>
+        <ul>{items}</ul>
+        """)
+LIST_ITEM = Template("<li>{item}</li>")
+COVER_LETTER = Template("""
+        <div class="header" style="background: linear-gradient(135deg, #2b2d42, #8d99ae);"><h1>Covering Letter</h1><p>For Visa Application</p></div>
+        <div class="content-section cover-letter">
+            <p>{main_text}</p>
+            {document_list}
+            <p>{closing_text}</p>
+        </div>
+    """)
+
+_BR = Markup('<br>')
+
+def _with_line_breaks(text: str):
+    for i, line in enumerate(text.split('\n')):
+        if i:
+            yield _BR
+        yield line
+
+def _airline(leg) -> str:
+    return 'N/A' if leg.airline is None else leg.airline
+
+def _render_page(title: str, body, classes: frozenset, stylesheet_url: str | None = None, sink=None) -> str | int:
+    """Renders `body` (a Fragment) into the page with the professional 'Ocean Blue' theme.
+
+    With `stylesheet_url`, the theme is linked (see THEME_FILE); otherwise only the rules for
+    `classes` are inlined, minified, and the page makes no external requests. With a binary
+    `sink`, the page is written to it as UTF-8 chunk by chunk and the byte count is returned."""
+    if stylesheet_url:
+        styles = SHARED_STYLES.fragment(stylesheet_url=stylesheet_url, font_url=FONT_STYLESHEET_URL)
+    else:
+        styles = Markup(f"<style>{_subset_stylesheet(classes | _BASE_CLASSES)}</style>")
+    if sink is not None:
+        return PAGE.write(sink, title=title, styles=styles, body=body)
+    return PAGE.render(title=title, styles=styles, body=body)
+
+@metrics.timed('render')
+def create_flight_ticket_html(data: dict, itinerary: Itinerary | None = None, stylesheet_url: str | None = None, sink=None) -> str | int:
+    itin = itinerary or Itinerary.from_form_data(data)
+    legs = itin.legs
+    body = FLIGHT_TICKET.fragment(
+        airline=('Travaky Airlines' if legs[0].airline is None else legs[0].airline) if legs else '',
+        legs=(FLIGHT_LEG.fragment(leg=leg, airline=_airline(leg), origin_code=leg.origin[:3].upper(), destination_code=leg.destination[:3].upper()) for leg in legs),
+        passengers=(PASSENGER.fragment(traveller=t) for t in itin.travellers),
+        fare=itin.base_fare,
+    )
+    return _render_page("Flight Ticket", body, FLIGHT_TICKET.classes | FLIGHT_LEG.classes, stylesheet_url, sink)
+
+@metrics.timed('render')
+def create_hotel_booking_html(data: dict, itinerary: Itinerary | None = None, stylesheet_url: str | None = None, sink=None) -> str | int:
+    selected_stays = (itinerary or Itinerary.from_form_data(data)).stays
+
+    if not selected_stays:
+        page = "<html><body>No hotel selected.</body></html>"
+        return page if sink is None else sink.write(page.encode('utf-8'))
+
+    body = HOTEL_BOOKING.fragment(stays=(HOTEL_STAY.fragment(stay=stay) for stay in selected_stays))
+    return _render_page("Hotel Confirmation", body, HOTEL_BOOKING.classes | HOTEL_STAY.classes, stylesheet_url, sink)
+
+@metrics.timed('render')
+def create_itinerary_html(data: dict, itinerary: Itinerary | None = None, stylesheet_url: str | None = None, sink=None) -> str | int:
+    itin = itinerary or Itinerary.from_form_data(data)
+    body = ITINERARY.fragment(passenger_name=itin.passenger_name, legs=(ITINERARY_LEG.fragment(leg=leg, airline=_airline(leg)) for leg in itin.legs))
+    return _render_page("Travel Itinerary", body, ITINERARY.classes | ITINERARY_LEG.classes, stylesheet_url, sink)
+
+@metrics.timed('render')
+def create_cover_letter_html(text: str, stylesheet_url: str | None = None, sink=None) -> str | int:
     # Split the letter to format the document list nicely
     parts = text.split("Please find below the list of documents enclosed with this application:")
     main_text = parts[0]
     
-    list_part = ""
+    document_list = Fragment()
     if len(parts) > 1:
         list_text = parts[1].split("I hope you find everything in order")[0]
         list_items = [item.strip() for item in list_text.split('\n') if item.strip()]
-        list_html = "".join([f"<li>{item}</li>" for item in list_items])
-        list_part = f"""
-        <p>Please find below the list of documents enclosed with this application:</p>
-        <ul>{list_html}</ul>
-        """
+        document_list = DOCUMENT_LIST.fragment(items=(LIST_ITEM.fragment(item=item) for item in list_items))
     
     closing_text = "I hope you find everything in order" + parts[1].split("I hope you find everything in order")[1] if len(parts) > 1 else ""
 
-    body = f"""
-        <div class="header" style="background: linear-gradient(135deg, #2b2d42, #8d99ae);"><h1>Covering Letter</h1><p>For Visa Application</p></div>
-        <div class="content-section cover-letter">
-            <p>{main_text.replace(chr(10), '<br>')}</p>
-            {list_part}
-            <p>{closing_text.replace(chr(10), '<br>')}</p>
-        </div>
-    """
-    return _get_base_html_template("Visa Cover Letter", body)
\ No newline at end of file
+    body = COVER_LETTER.fragment(main_text=_with_line_breaks(main_text), document_list=document_list, closing_text=_with_line_breaks(closing_text))
+    return _render_page("Visa Cover Letter", body, COVER_LETTER.classes | DOCUMENT_LIST.classes, stylesheet_url, sink)
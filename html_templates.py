@@ -0,0 +1,84 @@
+import html
+import re
+import string
+
+# --- TEMPLATES ---
+
+class Markup(str):
+    """Text that is already HTML; inserted as-is instead of being escaped."""
+    __slots__ = ()
+
+class Fragment(list):
+    """Chunks rendered by a template; inserted as-is, like Markup."""
+    __slots__ = ()
+
+_escape = html.escape
+
+def _emit(append, value, spec: str):
+    """Slow path for any field value other than a plain str."""
+    if isinstance(value, Markup):
+        append(value)
+    elif isinstance(value, Fragment):
+        for chunk in value:
+            append(chunk)
+    elif isinstance(value, str) or not hasattr(value, '__iter__'):
+        append(_escape(format(value, spec)))
+    else:
+        # A list or generator of values, e.g. one Fragment per itinerary leg.
+        for item in value:
+            _emit(append, item, '')
+
+class Template:
+    """An HTML template compiled once into a Python function that appends its chunks.
+
+    Fields use str.format syntax: {name}, {name.attr.attr} and {name:spec} (e.g. {date:%d %b %Y}).
+    Values are HTML-escaped unless they are Markup or a Fragment; any other iterable (e.g. a
+    generator of Fragments, one per leg) is inserted item by item. render() joins once at the end;
+    write() sends the chunks to a file as they are produced."""
+    __slots__ = ('source', 'classes', '_render')
+
+    def __init__(self, source: str, name: str = 'template'):
+        self.source = source
+        lines = ["def render(append, values):"]
+        for literal, field, spec, conversion in string.Formatter().parse(source):
+            if literal:
+                lines.append(f"    append({literal!r})")
+            if field is None:
+                continue
+            root, *attrs = field.split('.')
+            if conversion or not all(part.isidentifier() for part in [root, *attrs]):
+                raise ValueError(f"Unsupported field {field!r} in {name}")
+            lines.append(f"    v = values[{root!r}]" + "".join(f".{attr}" for attr in attrs))
+            if spec:
+                lines.append(f"    _emit(append, v, {spec!r})")
+            else:
+                lines.append("    append(_escape(v)) if v.__class__ is str else _emit(append, v, '')")
+        if len(lines) == 1:
+            lines.append("    pass")
+        namespace = {'_escape': _escape, '_emit': _emit}
+        exec(compile("\n".join(lines), f"<{name}>", 'exec'), namespace)
+        self._render = namespace['render']
+        # Classes named in the markup, for subsetting the stylesheet.
+        self.classes = frozenset(c for attr in re.findall(r'class="([^"]*)"', source) for c in attr.split())
+
+    def fragment(self, **values) -> Fragment:
+        """Renders into chunks for a field of another template."""
+        chunks = Fragment()
+        self._render(chunks.append, values)
+        return chunks
+
+    def render(self, **values) -> str:
+        chunks = []
+        self._render(chunks.append, values)
+        return "".join(chunks)
+
+    def write(self, file, /, **values) -> int:
+        """Streams the UTF-8 encoded document to a binary file-like object; returns the bytes written."""
+        written = 0
+        def append(chunk: str):
+            nonlocal written
+            data = chunk.encode('utf-8')
+            file.write(data)
+            written += len(data)
+        self._render(append, values)
+        return written
@@ -0,0 +1,113 @@
+import datetime
+import uuid
+from dataclasses import dataclass
+
+# --- ITINERARY MODEL ---
+
+# Normalized once per submission from form_data and shared by every generator, so the trips
+# are sorted, origins resolved and nights/costs computed a single time. Values the form may
+# omit (a leg's airline, the main passenger's gender) stay None, as the PDF and HTML generators
+# have always shown different placeholders for them.
+
+TAX_RATE = 0.18
+
+@dataclass(frozen=True, slots=True)
+class Traveller:
+    name: str
+    gender: str | None
+
+@dataclass(frozen=True, slots=True)
+class Leg:
+    index: int
+    origin: str
+    destination: str
+    arrival_date: datetime.date
+    departure_date: datetime.date
+    airline: str | None
+    pnr: str
+    flight_no: str
+    ticket_no: str
+    dep_time: str
+    arr_time: str
+
+@dataclass(frozen=True, slots=True)
+class Stay:
+    hotel_name: str
+    city: str
+    country: str
+    check_in: datetime.date
+    check_out: datetime.date
+    nights: int
+    guests: int
+    nightly_rate: float
+    total_cost: float
+
+@dataclass(frozen=True, slots=True)
+class Itinerary:
+    trip_id: str
+    passenger_name: str
+    hometown: str
+    travellers: tuple
+    legs: tuple
+    stays: tuple
+    flight_cost_per_person: float
+    base_fare: float
+    taxes: float
+    total_fare: float
+
+    @property
+    def passenger_names(self) -> list:
+        return [t.name for t in self.travellers]
+
+    @property
+    def final_destination(self) -> str | None:
+        return self.legs[-1].destination if self.legs else None
+
+    @property
+    def start_date(self) -> datetime.date | None:
+        return self.legs[0].arrival_date if self.legs else None
+
+    @property
+    def end_date(self) -> datetime.date | None:
+        return self.legs[-1].departure_date if self.legs else None
+
+    @property
+    def total_stay_cost(self) -> float:
+        return sum(stay.total_cost for stay in self.stays)
+
+    @classmethod
+    def from_form_data(cls, data: dict) -> 'Itinerary':
+        passenger_name, hometown = data.get('passenger_name', 'N/A'), data.get('hometown', 'Home City')
+        family = data.get('family_members', [])
+        travellers = (Traveller(passenger_name, data.get('gender')),) + tuple(Traveller(p['name'], p.get('gender', 'N/A')) for p in family)
+
+        legs, origin = [], hometown
+        for i, trip in enumerate(sorted(data.get('trips', []), key=lambda x: x['arrival_date'])):
+            legs.append(Leg(
+                index=i, origin=origin, destination=trip['country'],
+                arrival_date=trip['arrival_date'], departure_date=trip['departure_date'],
+                airline=trip.get('airline'), pnr=trip.get('pnr', 'N/A'),
+                flight_no=trip.get('flight_no', 'N/A'), ticket_no=trip.get('ticket_no', 'N/A'),
+                dep_time=trip.get('dep_time', 'N/A'), arr_time=trip.get('arr_time', 'N/A'),
+            ))
+            origin = trip['country']
+
+        stays = []
+        for stay in data.get('selected_hotels_per_trip', []):
+            hotel, trip = stay['hotel_data'], stay['trip_data']
+            nights = max(1, (trip['departure_date'] - trip['arrival_date']).days)
+            rate = float(hotel.get('Rate', 0))
+            stays.append(Stay(
+                hotel_name=hotel['Hotel Name'], city=hotel['City'], country=hotel['Country'],
+                check_in=trip['arrival_date'], check_out=trip['departure_date'], nights=nights,
+                guests=len(travellers), nightly_rate=rate, total_cost=rate * nights * len(travellers),
+            ))
+
+        flight_cost = data.get('flight_cost', 0.0)
+        base_fare = flight_cost * len(travellers)
+        return cls(
+            trip_id=data.get('uuid', str(uuid.uuid4())).split('-')[0].upper(),
+            passenger_name=passenger_name, hometown=hometown, travellers=travellers,
+            legs=tuple(legs), stays=tuple(stays), flight_cost_per_person=flight_cost,
+            base_fare=base_fare, taxes=base_fare * TAX_RATE, total_fare=base_fare + base_fare * TAX_RATE,
+        )
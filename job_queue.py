@@ -0,0 +1,250 @@
+"""Durable, SQLite-backed queue of document generation jobs, and the workers that run them.
+
+The app enqueues a submission and polls its job; workers run submission.run_submission and
+write progress and the final URLs back. Workers run inside the app process (see
+TRAVAKY_JOB_WORKERS) and/or as separate processes sharing the same database file:
+
+    python job_queue.py --concurrency 4       # SUPABASE_URL/SUPABASE_KEY/GROQ_API_KEY from env
+"""
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+
+import batch_generator
+import submission
+import task_graph
+
+# --- CONFIGURATION ---
+
+JOB_DB_PATH = os.environ.get('TRAVAKY_JOB_DB', os.path.join('.cache', 'jobs.sqlite3'))
+# Worker threads started inside each app process; 0 leaves all jobs to external workers.
+INPROCESS_WORKERS = int(os.environ.get('TRAVAKY_JOB_WORKERS', '2'))
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+# --- QUEUE ---
+
+class Job:
+    __slots__ = ('id', 'status', 'payload', 'result', 'error', 'progress', 'attempts', 'worker', 'created_at', 'updated_at')
+
+    def __init__(self, row: sqlite3.Row):
+        self.id, self.status, self.attempts, self.worker = row['id'], row['status'], row['attempts'], row['worker']
+        self.payload = json.loads(row['payload'])
+        self.result = json.loads(row['result']) if row['result'] else None
+        self.progress = json.loads(row['progress']) if row['progress'] else None
+        self.error, self.created_at, self.updated_at = row['error'], row['created_at'], row['updated_at']
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+class JobQueue:
+    """Jobs table in one SQLite file, shared safely by threads and processes.
+
+    A claimed job holds a lease that its worker renews while it runs; a job whose worker died is
+    handed out again once its lease expires, up to `max_attempts` times. Updates from a worker
+    that has lost its lease (the job was handed to another) are ignored."""
+
+    def __init__(self, path: str = JOB_DB_PATH, lease: float = 120, max_attempts: int = 3):
+        self.path, self.lease, self.max_attempts = path, lease, max_attempts
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY, status TEXT NOT NULL, payload TEXT NOT NULL, result TEXT, error TEXT,
+                progress TEXT, attempts INTEGER NOT NULL DEFAULT 0, worker TEXT, lease_until REAL,
+                created_at REAL NOT NULL, updated_at REAL NOT NULL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)")
+
+    @contextlib.contextmanager
+    def _connect(self):
+        # One short-lived connection per operation: cheap for SQLite, and safe across threads and processes.
+        # Leaving the block commits an explicit BEGIN, or rolls it back on error.
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, payload: dict, job_id: str | None = None) -> tuple[str, bool]:
+        """Queues a job; returns its id and whether `payload` was accepted.
+
+        Re-enqueueing an id that failed queues it again with the new payload. An id that is queued,
+        running or done is left untouched and the payload is rejected (accepted is False)."""
+        job_id, now = job_id or str(uuid.uuid4()), time.time()
+        encoded = json.dumps(payload, default=_encode_value)
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            cursor = conn.execute(
+                """INSERT INTO jobs (id, status, payload, created_at, updated_at) VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT(id) DO UPDATE SET status = excluded.status, payload = excluded.payload, result = NULL,
+                   error = NULL, progress = NULL, attempts = 0, updated_at = excluded.updated_at WHERE jobs.status = ?""",
+                (job_id, QUEUED, encoded, now, now, FAILED),
+            )
+        return job_id, cursor.rowcount == 1
+
+    def get(self, job_id: str) -> Job | None:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return Job(row) if row else None
+
+    def claim(self, worker: str) -> Job | None:
+        """Leases the oldest queued (or abandoned) job to `worker`."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            while True:
+                row = conn.execute(
+                    "SELECT id, attempts FROM jobs WHERE status = ? OR (status = ? AND lease_until < ?) ORDER BY created_at LIMIT 1",
+                    (QUEUED, RUNNING, now),
+                ).fetchone()
+                if row is None:
+                    return None
+                if row['attempts'] < self.max_attempts:
+                    break
+                conn.execute("UPDATE jobs SET status = ?, error = ? || COALESCE(error, 'lease expired'), lease_until = NULL, updated_at = ? WHERE id = ?",
+                             (FAILED, f"gave up after {row['attempts']} attempts; last error: ", now, row['id']))
+            conn.execute("UPDATE jobs SET status = ?, worker = ?, lease_until = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                         (RUNNING, worker, now + self.lease, now, row['id']))
+            return Job(conn.execute("SELECT * FROM jobs WHERE id = ?", (row['id'],)).fetchone())
+
+    def renew(self, job_id: str, worker: str) -> bool:
+        """Extends `worker`'s lease on the job; False if the job is no longer leased to it."""
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute("UPDATE jobs SET lease_until = ?, updated_at = ? WHERE id = ? AND status = ? AND worker = ?",
+                                  (now + self.lease, now, job_id, RUNNING, worker))
+        return cursor.rowcount == 1
+
+    def report_progress(self, job_id: str, worker: str, progress: dict) -> bool:
+        """Stores progress and renews the job's lease; False if the job is no longer leased to `worker`."""
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute("UPDATE jobs SET progress = ?, lease_until = ?, updated_at = ? WHERE id = ? AND status = ? AND worker = ?",
+                                  (json.dumps(progress), now + self.lease, now, job_id, RUNNING, worker))
+        return cursor.rowcount == 1
+
+    def finish(self, job_id: str, worker: str, status: str, result: dict | None = None, error: str | None = None) -> bool:
+        """Records the outcome; False (and nothing written) if the job is no longer leased to `worker`."""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, lease_until = NULL, updated_at = ? WHERE id = ? AND status = ? AND worker = ?",
+                (status, json.dumps(result) if result is not None else None, error, time.time(), job_id, RUNNING, worker),
+            )
+        return cursor.rowcount == 1
+
+    def release(self, job_id: str, worker: str, error: str):
+        """Puts a job whose run crashed back in the queue (claim() fails it once attempts run out)."""
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET status = ?, error = ?, lease_until = NULL, updated_at = ? WHERE id = ? AND status = ? AND worker = ?",
+                         (QUEUED, error, time.time(), job_id, RUNNING, worker))
+
+def _encode_value(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return str(value)
+
+# --- WORKERS ---
+
+def run_job(queue: JobQueue, job: Job, supabase, llm_client):
+    """Runs one claimed job through the submission pipeline and records its outcome.
+
+    A heartbeat thread renews the lease every third of it, so a slow task (an LLM call, a large
+    upload) does not let the job be handed to another worker while this one is still running it."""
+    def on_task_done(task, finished_count, total):
+        queue.report_progress(job.id, job.worker, {'done': finished_count, 'total': total, 'last': task.name})
+
+    def heartbeat():
+        while not stopped.wait(queue.lease / 3):
+            try:
+                if not queue.renew(job.id, job.worker):
+                    return
+            except sqlite3.Error:
+                pass
+
+    stopped = threading.Event()
+    heartbeat_thread = threading.Thread(target=heartbeat, name=f"job-heartbeat-{job.id}", daemon=True)
+    heartbeat_thread.start()
+    payload = job.payload
+    try:
+        document_urls, graph = submission.run_submission(
+            supabase, llm_client, batch_generator.parse_form_data(payload['form_data']), payload['documents'],
+            polish_cover_letter=payload.get('polish_cover_letter', False), on_task_done=on_task_done,
+            bundle_pdfs=payload.get('bundle_pdfs', False),
+        )
+    finally:
+        stopped.set()
+        heartbeat_thread.join()
+    errors = {name: str(error) for name, error in graph.errors.items() if not isinstance(error, task_graph.SkippedError)}
+    result = {'document_urls': document_urls, 'errors': errors, 'timings': submission.timing_summary(graph)}
+    # The record counts as stored once the insert succeeded; otherwise the user can resubmit the same job id.
+    stored = 'db_insert' not in graph.errors and bool(document_urls)
+    queue.finish(job.id, job.worker, DONE if stored else FAILED, result, None if stored else errors.get('db_insert', "no documents were stored"))
+
+class WorkerPool:
+    """Threads that claim and run jobs until stopped."""
+
+    def __init__(self, queue: JobQueue, supabase, llm_client, concurrency: int = 2, poll_interval: float = 0.5):
+        self.queue, self.supabase, self.llm_client = queue, supabase, llm_client
+        self.concurrency, self.poll_interval = concurrency, poll_interval
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self) -> 'WorkerPool':
+        for i in range(self.concurrency):
+            name = f"{socket.gethostname()}:{os.getpid()}:{i}"
+            thread = threading.Thread(target=self._loop, args=(name,), name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout: float | None = None):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _loop(self, name: str):
+        while not self._stop.is_set():
+            try:
+                job = self.queue.claim(name)
+            except sqlite3.Error:
+                job = None
+            if job is None:
+                self._stop.wait(self.poll_interval)
+                continue
+            try:
+                run_job(self.queue, job, self.supabase, self.llm_client)
+            except Exception as e:
+                self.queue.release(job.id, job.worker, repr(e))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run document generation workers against the job queue.")
+    parser.add_argument('--db', default=JOB_DB_PATH, help="Job queue database (TRAVAKY_JOB_DB)")
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--poll-interval', type=float, default=0.5)
+    args = parser.parse_args(argv)
+
+    import services
+    settings = services.Settings.from_env()
+    pool = WorkerPool(JobQueue(args.db), services.create_supabase_client(settings), services.create_llm_client(settings),
+                      args.concurrency, args.poll_interval).start()
+    print(f"{args.concurrency} worker(s) polling {args.db}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pool.stop()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""Offline load test: N concurrent submissions through submission.run_submission, as app1.py runs them.
+
+Storage, travel_records and the LLM are the in-process stand-ins from local_backends, with
+configurable latency, so the run needs no network and no credentials.
+
+Usage:
+    python loadtest.py --submissions 200 --concurrency 16
+    python loadtest.py --submissions 50 --concurrency 8 --polish --llm-latency 1.5 --storage-latency 0.2
+"""
+import argparse
+import concurrent.futures
+import json
+import sys
+import tempfile
+import time
+
+import benchmark
+import local_backends
+import submission
+
+def run_load(supabase, llm_client, submissions: int, concurrency: int, documents: list[str],
+             polish: bool = False, trips: int = 2, passengers: int = 2, stays: int = 1, bundle_pdfs: bool = False) -> dict:
+    """Runs `submissions` submissions, `concurrency` at a time; returns throughput, latency percentiles and stage timings."""
+    def submit(i: int) -> tuple[float, dict]:
+        form_data = benchmark.make_form_data(trips=trips, passengers=passengers, stays=stays, seed=i)
+        # Distinct applicants, so neither the document cache nor the cover letter memo serves repeats.
+        form_data['passenger_name'] = f"Load Test {i}"
+        started = time.perf_counter()
+        _, graph = submission.run_submission(supabase, llm_client, form_data, documents, polish_cover_letter=polish, bundle_pdfs=bundle_pdfs)
+        return time.perf_counter() - started, graph
+
+    latencies, failed, stages = [], 0, {}
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="submission") as pool:
+        for future in concurrent.futures.as_completed([pool.submit(submit, i) for i in range(submissions)]):
+            latency, graph = future.result()
+            latencies.append(latency)
+            if graph.errors:
+                failed += 1
+            for name, seconds in submission.timing_summary(graph)['stages'].items():
+                stages.setdefault(name.split(':', 1)[0], []).append(seconds)
+    wall = time.perf_counter() - started
+
+    def percentiles(samples):
+        return {f"p{q}_s": round(benchmark.percentile(samples, q), 4) for q in (50, 95, 99)}
+    return {
+        'submissions': submissions, 'concurrency': concurrency, 'failed': failed,
+        'wall_s': round(wall, 3), 'throughput_per_s': round(submissions / wall, 3),
+        'latency': percentiles(latencies),
+        'stages': {stage: percentiles(samples) for stage, samples in sorted(stages.items())},
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the submission pipeline against local stand-ins.")
+    parser.add_argument('--submissions', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--documents', nargs='+', choices=sorted(submission.DOCUMENTS),
+                        default=sorted(set(submission.DOCUMENTS) - {'pdf_visa_pack'}))
+    parser.add_argument('--bundle-pdfs', action='store_true', help="Bundle the PDFs into one visa pack per submission")
+    parser.add_argument('--polish', action='store_true', help="Polish cover letters through the canned LLM")
+    parser.add_argument('--llm-latency', type=float, default=1.0)
+    parser.add_argument('--storage-latency', type=float, default=0.1, help="Seconds per upload")
+    parser.add_argument('--db-latency', type=float, default=0.05, help="Seconds per travel_records query")
+    parser.add_argument('--trips', type=int, default=2)
+    parser.add_argument('--passengers', type=int, default=2)
+    parser.add_argument('--stays', type=int, default=1)
+    parser.add_argument('--root', help="Directory for the local bucket and SQLite file (default: a temporary directory)")
+    parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="travaky-load-") as tmp:
+        supabase = local_backends.LocalSupabase(args.root or tmp, args.storage_latency, args.db_latency)
+        llm_client = local_backends.CannedLLM(args.llm_latency)
+        report = run_load(supabase, llm_client, args.submissions, args.concurrency, args.documents,
+                          args.polish, args.trips, args.passengers, args.stays, args.bundle_pdfs)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        latency = report['latency']
+        print(f"{report['submissions']} submissions, concurrency {report['concurrency']}: "
+              f"{report['throughput_per_s']:.2f}/s, failed={report['failed']}")
+        print(f"latency p50={latency['p50_s']:.3f}s p95={latency['p95_s']:.3f}s p99={latency['p99_s']:.3f}s")
+        for stage, p in report['stages'].items():
+            print(f"  {stage:<18} p50={p['p50_s']:.3f}s p95={p['p95_s']:.3f}s p99={p['p99_s']:.3f}s")
+    return 1 if report['failed'] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
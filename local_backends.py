@@ -0,0 +1,266 @@
+import datetime
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# --- STAND-INS ---
+
+# In-process replacements for the Supabase and Groq clients, covering the calls services,
+# submission, record_history and hotel_catalogue make. Used by loadtest.py, and by the app
+# itself when TRAVAKY_LOCAL_BACKEND points at a directory.
+
+class LocalResponse:
+    __slots__ = ('data',)
+
+    def __init__(self, data: list):
+        self.data = data
+
+# Columns of the tables the app writes. Other tables (e.g. a seeded hotel_attraction_list)
+# have whatever columns their stored rows have.
+SCHEMA = {
+    'travel_records': frozenset((
+        'id', 'created_at', 'uuid', 'passenger_name', 'age', 'gender', 'hometown', 'flight_cost', 'trips',
+        'family_members', 'job_title', 'company_name', 'joining_date', 'passport_number', 'phone_number',
+        'selected_hotel', 'timings',
+        'pdf_flight_ticket_url', 'pdf_hotel_booking_url', 'pdf_itinerary_url', 'pdf_cover_letter_url', 'pdf_visa_pack_url',
+        'html_flight_url', 'html_hotel_url', 'html_itinerary_url', 'html_cover_letter_url',
+    )),
+}
+
+class LocalAPIError(Exception):
+    """Raised where postgrest would raise APIError, e.g. for a column the table does not have."""
+
+    def __init__(self, message: str, code: str):
+        super().__init__(message)
+        self.message, self.code = message, code
+
+class LocalBucket:
+    """A storage bucket backed by a directory; mirrors storage3's upload/get_public_url."""
+
+    def __init__(self, root: str, name: str, latency: float = 0.0):
+        self.root, self.name, self.latency = os.path.join(root, name), name, latency
+
+    def upload(self, file: bytes, path: str, file_options: dict | None = None):
+        time.sleep(self.latency)
+        target = os.path.join(self.root, path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            with open(target, 'xb') as f:
+                f.write(file)
+        except FileExistsError:
+            raise RuntimeError(f"Duplicate: The resource already exists ({self.name}/{path})") from None
+        return LocalResponse([{'Key': f"{self.name}/{path}"}])
+
+    def download(self, path: str) -> bytes:
+        time.sleep(self.latency)
+        with open(os.path.join(self.root, path), 'rb') as f:
+            return f.read()
+
+    def update(self, path: str, file: bytes, file_options: dict | None = None):
+        time.sleep(self.latency)
+        target = os.path.join(self.root, path)
+        tmp_path = f"{target}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(file)
+        os.replace(tmp_path, target)
+        return LocalResponse([{'Key': f"{self.name}/{path}"}])
+
+    def get_public_url(self, path: str) -> str:
+        return f"file://{os.path.abspath(os.path.join(self.root, path))}"
+
+class LocalStorage:
+    def __init__(self, root: str, latency: float = 0.0):
+        self.root, self.latency = root, latency
+
+    def from_(self, name: str) -> LocalBucket:
+        return LocalBucket(self.root, name, self.latency)
+
+_OPERATORS = {'eq': '=', 'gt': '>', 'lt': '<'}
+
+def _split_terms(text: str) -> list:
+    """Splits a PostgREST logic tree on its top-level commas, skipping nested and(...) and quoted values."""
+    terms, depth, quoted, start = [], 0, False, 0
+    for i, char in enumerate(text):
+        if char == '"' and text[i - 1:i] != '\\':
+            quoted = not quoted
+        elif not quoted and char in '()':
+            depth += 1 if char == '(' else -1
+        elif not quoted and char == ',' and depth == 0:
+            terms.append(text[start:i])
+            start = i + 1
+    return terms + [text[start:]]
+
+def _logic_tree(text: str, joiner: str) -> tuple[str, list, list]:
+    """SQL, parameters and column names for the `col.op.value` terms of a PostgREST or=/and= filter."""
+    clauses, params, columns = [], [], []
+    for term in _split_terms(text):
+        term = term.strip()
+        for prefix in ('and(', 'or('):
+            if term.startswith(prefix) and term.endswith(')'):
+                sql, nested_params, nested_columns = _logic_tree(term[len(prefix):-1], prefix[:-1].upper())
+                break
+        else:
+            column, op, value = term.split('.', 2)
+            if op not in _OPERATORS:
+                raise LocalAPIError(f'unsupported operator "{op}" in logic tree', 'PGRST100')
+            if value.startswith('"') and value.endswith('"'):
+                value = value[1:-1].replace('\\"', '"').replace('\\\\', '\\')
+            # Values arrive as text; like PostgREST, compare them as numbers against a numeric column.
+            path = f'$."{column}"'
+            sql = (f"json_extract(data, ?) {_OPERATORS[op]} "
+                   "(CASE WHEN json_type(data, ?) IN ('integer', 'real') THEN CAST(? AS NUMERIC) ELSE ? END)")
+            nested_params, nested_columns = [path, path, value, value], [column]
+        clauses.append(sql)
+        params += nested_params
+        columns += nested_columns
+    return "(" + f" {joiner} ".join(clauses) + ")", params, columns
+
+class LocalQuery:
+    """The subset of postgrest's query builder the app uses, over rows stored as JSON in SQLite."""
+
+    def __init__(self, db: 'LocalDatabase', table: str):
+        self.db, self.table = db, table
+        self._columns, self._insert = None, None
+        self._where, self._params, self._order, self._limit = [], [], [], None
+        self._referenced = []
+
+    def select(self, columns: str = "*") -> 'LocalQuery':
+        self._columns = None if columns.strip() == "*" else [c.strip().strip('"') for c in columns.split(",")]
+        return self
+
+    def insert(self, row: dict | list) -> 'LocalQuery':
+        self._insert = row if isinstance(row, list) else [row]
+        return self
+
+    def _filter(self, column: str, op: str, value) -> 'LocalQuery':
+        self._where.append(f"json_extract(data, ?) {op} ?")
+        self._params += [f'$."{column}"', value]
+        self._referenced.append(column)
+        return self
+
+    def eq(self, column, value): return self._filter(column, "=", value)
+    def gt(self, column, value): return self._filter(column, ">", value)
+    def lt(self, column, value): return self._filter(column, "<", value)
+
+    def ilike(self, column: str, pattern: str) -> 'LocalQuery':
+        self._where.append("json_extract(data, ?) LIKE ? ESCAPE '\\'")
+        self._params += [f'$."{column}"', pattern]
+        self._referenced.append(column)
+        return self
+
+    def or_(self, filters: str) -> 'LocalQuery':
+        """PostgREST's logic tree filter, e.g. 'a.lt.1,and(a.eq.1,b.lt.2)'; eq/gt/lt terms only."""
+        sql, params, columns = _logic_tree(filters, 'OR')
+        self._where.append(sql)
+        self._params += params
+        self._referenced += columns
+        return self
+
+    def order(self, column: str, desc: bool = False) -> 'LocalQuery':
+        self._order.append((column, desc))
+        self._referenced.append(column)
+        return self
+
+    def limit(self, count: int) -> 'LocalQuery':
+        self._limit = count
+        return self
+
+    def execute(self) -> LocalResponse:
+        if self._insert is not None:
+            return LocalResponse(self.db.insert(self.table, self._insert))
+        self.db.check_columns(self.table, (self._columns or []) + self._referenced)
+        sql, params = f'SELECT data FROM "{self.table}"', list(self._params)
+        if self._where:
+            sql += " WHERE " + " AND ".join(self._where)
+        if self._order:
+            sql += " ORDER BY " + ", ".join(f"json_extract(data, ?) {'DESC' if desc else 'ASC'}" for _, desc in self._order)
+            params += [f'$."{column}"' for column, _ in self._order]
+        if self._limit is not None:
+            sql += " LIMIT ?"
+            params.append(self._limit)
+        rows = [json.loads(data) for (data,) in self.db.query(self.table, sql, params)]
+        if self._columns:
+            rows = [{c: row.get(c) for c in self._columns} for row in rows]
+        return LocalResponse(rows)
+
+class LocalDatabase:
+    """One SQLite file; every table is (id, data JSON). Safe to share between threads.
+
+    A table's columns are those in SCHEMA, or else the keys of the rows stored in it; selecting,
+    filtering or ordering on any other column (or inserting one into a SCHEMA table) raises LocalAPIError."""
+
+    def __init__(self, path: str, latency: float = 0.0):
+        self.latency = latency
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._columns = {}
+
+    def _ensure(self, table: str) -> set:
+        if table not in self._columns:
+            self._conn.execute(f'CREATE TABLE IF NOT EXISTS "{table}" (id INTEGER PRIMARY KEY AUTOINCREMENT, data TEXT NOT NULL)')
+            keys = self._conn.execute(f'SELECT DISTINCT key FROM "{table}", json_each("{table}".data)').fetchall()
+            self._columns[table] = set(SCHEMA.get(table, ())) | {key for (key,) in keys}
+        return self._columns[table]
+
+    def check_columns(self, table: str, columns: list):
+        with self._lock:
+            known = self._ensure(table)
+        unknown = [c for c in columns if known and c not in known]
+        if unknown:
+            raise LocalAPIError(f'column {table}.{unknown[0]} does not exist', '42703')
+
+    def insert(self, table: str, rows: list) -> list:
+        time.sleep(self.latency)
+        stored = []
+        with self._lock:
+            unknown = [c for row in rows for c in row if table in SCHEMA and c not in SCHEMA[table]]
+            if unknown:
+                raise LocalAPIError(f"Could not find the '{unknown[0]}' column of '{table}' in the schema cache", 'PGRST204')
+            known = self._ensure(table)
+            for row in rows:
+                row = {'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(), **row}
+                cursor = self._conn.execute(f'INSERT INTO "{table}" (data) VALUES (?)', ('{}',))
+                row.setdefault('id', cursor.lastrowid)
+                self._conn.execute(f'UPDATE "{table}" SET data = ? WHERE id = ?', (json.dumps(row, default=str), cursor.lastrowid))
+                known.update(row)
+                stored.append(row)
+            self._conn.commit()
+        return stored
+
+    def query(self, table: str, sql: str, params: list) -> list:
+        time.sleep(self.latency)
+        with self._lock:
+            self._ensure(table)
+            return self._conn.execute(sql, params).fetchall()
+
+class LocalSupabase:
+    """Drop-in for supabase.Client: `storage.from_(bucket)` and `table(name)` backed by a directory."""
+
+    def __init__(self, root: str, storage_latency: float = 0.0, db_latency: float = 0.0):
+        os.makedirs(root, exist_ok=True)
+        self.supabase_url = f"file://{os.path.abspath(root)}"
+        self.storage = LocalStorage(os.path.join(root, 'storage'), storage_latency)
+        self.db = LocalDatabase(os.path.join(root, 'travel.sqlite3'), db_latency)
+
+    def table(self, name: str) -> LocalQuery:
+        return LocalQuery(self.db, name)
+
+class CannedLLM:
+    """Drop-in for the Groq client: returns `reply` (or echoes the prompt's letter) after `latency` seconds."""
+
+    def __init__(self, latency: float = 1.0, reply: str | None = None):
+        self.latency, self.reply = latency, reply
+        self.calls = 0
+        self._calls_lock = threading.Lock()  # Submissions call it from many threads at once.
+        self.chat = self
+        self.completions = self
+
+    def create(self, messages: list, model: str):
+        time.sleep(self.latency)
+        with self._calls_lock:
+            self.calls += 1
+        content = self.reply if self.reply is not None else messages[-1]['content'].split("--- LETTER ---", 1)[-1].strip()
+        message = type('Message', (), {'content': content})()
+        return type('Completion', (), {'choices': [type('Choice', (), {'message': message})()]})()
@@ -0,0 +1,139 @@
+import contextlib
+import functools
+import os
+import threading
+import time
+
+# --- CONFIGURATION ---
+
+# TRAVAKY_METRICS=0 turns instrumentation off; timed functions then cost one attribute check.
+ENABLED = os.environ.get('TRAVAKY_METRICS', '1') != '0'
+# Prometheus text file rewritten after each submission (e.g. for node_exporter's textfile collector).
+METRICS_FILE = os.environ.get('TRAVAKY_METRICS_FILE')
+# Store a per-record timing summary in travel_records.timings (needs a jsonb `timings` column).
+RECORD_TIMINGS = os.environ.get('TRAVAKY_RECORD_TIMINGS') == '1'
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# --- REGISTRY ---
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense."""
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: tuple):
+        self.buckets, self.counts = buckets, [0] * len(buckets)
+        self.sum, self.count = 0.0, 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+class MetricsRegistry:
+    """Process-wide call counters plus duration and output-size histograms per (stage, name)."""
+
+    def __init__(self, enabled: bool = ENABLED):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._calls, self._errors, self._durations, self._sizes = {}, {}, {}, {}
+
+    def observe(self, stage: str, name: str, seconds: float, size: int | None = None, error: bool = False):
+        key = (stage, name)
+        with self._lock:
+            self._calls[key] = self._calls.get(key, 0) + 1
+            if error:
+                self._errors[key] = self._errors.get(key, 0) + 1
+            self._durations.setdefault(key, Histogram(DURATION_BUCKETS)).observe(seconds)
+            if size is not None:
+                self._sizes.setdefault(key, Histogram(SIZE_BUCKETS)).observe(size)
+
+    def reset(self):
+        with self._lock:
+            self._calls, self._errors, self._durations, self._sizes = {}, {}, {}, {}
+
+    def render_prometheus(self) -> str:
+        """Renders every metric in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            lines += ["# HELP travaky_calls_total Instrumented calls by stage.", "# TYPE travaky_calls_total counter"]
+            lines += [f"travaky_calls_total{_labels(key)} {count}" for key, count in sorted(self._calls.items())]
+            lines += ["# HELP travaky_errors_total Instrumented calls that raised.", "# TYPE travaky_errors_total counter"]
+            lines += [f"travaky_errors_total{_labels(key)} {count}" for key, count in sorted(self._errors.items())]
+            lines += _histogram_lines('travaky_stage_duration_seconds', "Wall-clock time per call.", self._durations)
+            lines += _histogram_lines('travaky_output_bytes', "Bytes produced or transferred per call.", self._sizes)
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        """Atomically replaces `path` with the current metrics."""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp_path, path)
+
+    def flush(self):
+        """Writes METRICS_FILE, if one is configured."""
+        if self.enabled and METRICS_FILE:
+            self.write(METRICS_FILE)
+
+def _labels(key: tuple, **extra) -> str:
+    pairs = [('stage', key[0]), ('name', key[1])] + list(extra.items())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+def _histogram_lines(metric: str, help_text: str, histograms: dict) -> list:
+    lines = [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+    for key, hist in sorted(histograms.items()):
+        for bound, count in zip(hist.buckets, hist.counts):
+            lines.append(f"{metric}_bucket{_labels(key, le=bound)} {count}")
+        lines.append(f"{metric}_bucket{_labels(key, le='+Inf')} {hist.count}")
+        lines.append(f"{metric}_sum{_labels(key)} {hist.sum}")
+        lines.append(f"{metric}_count{_labels(key)} {hist.count}")
+    return lines
+
+# Shared by every Streamlit session and worker thread in the process.
+registry = MetricsRegistry()
+
+# --- INSTRUMENTATION ---
+
+def _size_of(result) -> int | None:
+    if isinstance(result, (bytes, bytearray)):
+        return len(result)
+    if isinstance(result, str):
+        return len(result.encode('utf-8'))
+    return None
+
+def timed(stage: str, name: str | None = None):
+    """Decorator recording each call's duration (and the size of a str/bytes result) under `stage`."""
+    def decorator(func):
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not registry.enabled:
+                return func(*args, **kwargs)
+            started, error, result = time.perf_counter(), True, None
+            try:
+                result = func(*args, **kwargs)
+                error = False
+                return result
+            finally:
+                registry.observe(stage, label, time.perf_counter() - started, _size_of(result), error)
+        return wrapper
+    return decorator
+
+@contextlib.contextmanager
+def timer(stage: str, name: str, size: int | None = None):
+    """Context manager form of `timed`, for a block such as one upload or one query."""
+    if not registry.enabled:
+        yield
+        return
+    started, error = time.perf_counter(), True
+    try:
+        yield
+        error = False
+    finally:
+        registry.observe(stage, name, time.perf_counter() - started, size, error)
@@ -0,0 +1,107 @@
+import functools
+import itertools
+
+# --- CODE 128 TABLES ---
+
+# Bar/space widths (in modules) for every Code 128 symbol value, 0-105.
+CODE128_PATTERNS = (
+    '212222', '222122', '222221', '121223', '121322', '131222', '122213', '122312', '132212', '221213',
+    '221312', '231212', '112232', '122132', '122231', '113222', '123122', '123221', '223211', '221132',
+    '221231', '213212', '223112', '312131', '311222', '321122', '321221', '312212', '322112', '322211',
+    '212123', '212321', '232121', '111323', '131123', '131321', '112313', '132113', '132311', '211313',
+    '231113', '231311', '112133', '112331', '132131', '113123', '113321', '133121', '313121', '211331',
+    '231131', '213113', '213311', '213131', '311123', '311321', '331121', '312113', '312311', '332111',
+    '314111', '221411', '431111', '111224', '111422', '121124', '121421', '141122', '141221', '112214',
+    '112412', '122114', '122411', '142112', '142211', '241211', '221114', '413111', '241112', '134111',
+    '111242', '121142', '121241', '114212', '124112', '124211', '411212', '421112', '421211', '212141',
+    '214121', '412121', '111143', '111341', '131141', '114113', '114311', '411113', '411311', '113141',
+    '114131', '311141', '411131', '211412', '211214', '211232',
+)
+CODE128_STOP = '2331112'
+CODE_B, CODE_C, START_B, START_C = 100, 99, 104, 105
+
+# --- ENCODING ---
+
+def _digit_run(text: str, start: int) -> int:
+    """Returns the length of the run of ASCII digits beginning at `start`."""
+    end = start
+    while end < len(text) and text[end] in '0123456789':
+        end += 1
+    return end - start
+
+def encode_code128(text: str) -> list[int]:
+    """Encodes text as Code 128 symbol values (start, data, checksum), switching to set C for long digit runs."""
+    text = text.encode('ascii', 'replace').decode('ascii')
+    values, i = [], 0
+    leading = _digit_run(text, 0)
+    use_c = leading >= 4 or leading == len(text) >= 2
+    values.append(START_C if use_c else START_B)
+    while i < len(text):
+        run = _digit_run(text, i)
+        if use_c:
+            if run >= 2:
+                values.append(int(text[i:i + 2])); i += 2
+                continue
+            values.append(CODE_B); use_c = False
+        # Switching to set C pays off for 6+ digits mid-string (4+ at the end).
+        if run >= 6 or (run >= 4 and i + run == len(text)):
+            if run % 2:
+                values.append(ord(text[i]) - 32); i += 1
+            values.append(CODE_C); use_c = True
+            continue
+        code = ord(text[i]) - 32
+        values.append(code if 0 <= code < 96 else ord('?') - 32); i += 1
+    checksum = values[0] + sum(pos * value for pos, value in enumerate(values[1:], start=1))
+    values.append(checksum % 103)
+    return values
+
+@functools.lru_cache(maxsize=256)
+def code128_widths(text: str) -> tuple[int, ...]:
+    """Returns the alternating bar/space module widths for text, starting with a bar and ending with the stop bar."""
+    patterns = [CODE128_PATTERNS[value] for value in encode_code128(text)] + [CODE128_STOP]
+    return tuple(int(w) for w in ''.join(patterns))
+
+# Light modules the QR spec requires around the symbol so scanners can find it.
+QR_QUIET_ZONE = 4
+
+def qr_matrix(data: str, error_correction: str = 'M') -> list[list[bool]]:
+    """Returns the QR module matrix for data (no quiet zone), True for dark modules."""
+    import qrcode  # Imported lazily: only the matrix builder is needed, never the PIL image factory.
+    levels = {'L': qrcode.constants.ERROR_CORRECT_L, 'M': qrcode.constants.ERROR_CORRECT_M,
+              'Q': qrcode.constants.ERROR_CORRECT_Q, 'H': qrcode.constants.ERROR_CORRECT_H}
+    qr = qrcode.QRCode(border=0, error_correction=levels[error_correction])
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr.get_matrix()
+
+# --- DRAWING ---
+
+def draw_code128(pdf, text: str, x: float, y: float, w: float, h: float):
+    """Draws a Code 128 barcode for text as filled rectangles fitted into the (x, y, w, h) box."""
+    widths = code128_widths(text)
+    module = w / sum(widths)
+    cursor = x
+    with pdf.local_context(fill_color=(0, 0, 0)):
+        for index, width in enumerate(widths):
+            if index % 2 == 0:
+                pdf.rect(cursor, y, width * module, h, style='F')
+            cursor += width * module
+
+def draw_qr_code(pdf, data: str, x: float, y: float, size: float, error_correction: str = 'M'):
+    """Draws a QR code for data as filled rectangles in a size x size square at (x, y).
+
+    The square includes the QR_QUIET_ZONE, painted white, so the code scans on any background."""
+    matrix = qr_matrix(data, error_correction)
+    module = size / (len(matrix) + 2 * QR_QUIET_ZONE)
+    origin_x, origin_y = x + QR_QUIET_ZONE * module, y + QR_QUIET_ZONE * module
+    with pdf.local_context(fill_color=(255, 255, 255)):
+        pdf.rect(x, y, size, size, style='F')
+    with pdf.local_context(fill_color=(0, 0, 0)):
+        for row_index, row in enumerate(matrix):
+            col = 0
+            # Merge horizontal runs of dark modules into one rectangle each.
+            for dark, run in itertools.groupby(row):
+                length = len(list(run))
+                if dark:
+                    pdf.rect(origin_x + col * module, origin_y + row_index * module, length * module, module, style='F')
+                col += length
@@ -1,10 +1,14 @@
 from fpdf import FPDF
+from fpdf.enums import MethodReturnValue, XPos, YPos
 import datetime
-import uuid
-import random
+import functools
+import importlib.util
 import io
-import barcode
-from barcode.writer import ImageWriter
+import os
+import random
+import metrics
+import pdf_barcodes
+from itinerary import Itinerary
 
 # --- BASE PDF CLASS ---
 
@@ -20,86 +24,200 @@ class PDF(FPDF):
         self.set_font('Arial', 'I', 8)
         self.cell(0, 10, f'Page {self.page_no()}', 0, 0, 'C')
 
+# --- DETERMINISTIC RENDERING ---
+
+# Re-rendering a record gives identical bytes, so the document cache and the upload index can
+# reuse the stored copy: seats, durations and aircraft come from an RNG seeded with the uuid, and
+# the creation date is the record's created_at rather than the time of rendering. fpdf2 derives
+# the file ID from the content and that date; linearized files get qpdf's deterministic ID.
+
+def _creation_date(data: dict | None = None) -> datetime.datetime:
+    """The record's created_at (a datetime or ISO string); without one, the start of the current UTC day."""
+    created_at = (data or {}).get('created_at')
+    if isinstance(created_at, str):
+        created_at = datetime.datetime.fromisoformat(created_at)
+    if isinstance(created_at, datetime.datetime):
+        return created_at if created_at.tzinfo else created_at.replace(tzinfo=datetime.timezone.utc)
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    return datetime.datetime(today.year, today.month, today.day, tzinfo=datetime.timezone.utc)
+
+def _record_rng(pdf: FPDF, data: dict) -> random.Random:
+    """Returns the RNG for one record and dates the document from the record."""
+    pdf.set_creation_date(_creation_date(data))
+    return random.Random(data['uuid']) if data.get('uuid') else random.Random()
+
+# --- OUTPUT ---
+
+# Documents are linearized ("fast web view") when the pikepdf package is installed: the first
+# page's objects and the hint tables come first, so a browser shows page one from the first bytes
+# and fetches the rest with range requests. fpdf2's own output(linearize=True) is unfinished (no
+# hint tables, asserts on some documents), so qpdf does it instead. TRAVAKY_PDF_LINEARIZE=0 opts out.
+LINEARIZE = os.environ.get('TRAVAKY_PDF_LINEARIZE', '1') != '0' and importlib.util.find_spec('pikepdf') is not None
+
+# With a sink, documents are written to any binary file-like object (temp file, socket, upload
+# body) in slices of this size, straight from fpdf2's output buffer instead of a bytes copy of it.
+# fpdf2 still builds the whole document in memory first, so this saves one copy of it; it does
+# not bound memory for long documents.
+WRITE_CHUNK_SIZE = 1 << 16
+
+class _CountingWriter(io.RawIOBase):
+    """Passes writes through to a sink that cannot tell() how much was written."""
+
+    def __init__(self, sink):
+        self.sink, self.written = sink, 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.sink.write(data)
+        self.written += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.written
+
+def _output(pdf: FPDF, sink=None) -> bytes | int:
+    """The finished document, linearized when LINEARIZE is set: as bytes, or written to `sink`
+    (returning the number of bytes written).
+
+    fpdf2 only serializes a document once every page is drawn, and keeps the pages and the
+    serialized buffer for as long as `pdf` lives. A sink saves the final bytes copy of the file
+    and the caller's buffering; when linearizing, qpdf writes straight into the sink, or into
+    the returned bytes."""
+    buffer = memoryview(pdf.output())
+    if LINEARIZE:
+        import pikepdf  # imported on first use; it is slow to load
+        source = io.BytesIO(buffer)
+        buffer.release()
+        if sink is None:
+            target = io.BytesIO()
+        else:
+            target = sink if getattr(sink, 'seekable', lambda: False)() else _CountingWriter(sink)
+        start = target.tell()
+        with pikepdf.open(source) as document:
+            # qpdf would otherwise write a random /ID; deterministic_id hashes the content instead, so a
+            # record (dated by its created_at, see _creation_date) linearizes to the same bytes every time.
+            document.save(target, linearize=True, deterministic_id=True)
+        source.close()
+        return target.getvalue() if sink is None else target.tell() - start
+    if sink is None:
+        return bytes(buffer)
+    for start in range(0, len(buffer), WRITE_CHUNK_SIZE):
+        sink.write(buffer[start:start + WRITE_CHUNK_SIZE])
+    return len(buffer)
+
+# --- STATIC BLOCKS ---
+
+# Text that is identical in every document. Line breaking is the slowest part of a render, so each
+# block is wrapped once per process (per font and width) and replayed line by line as plain cells.
+
+FLIGHT_RULES = (
+    "All timings are local to the respective airport. Please verify flight times with the airline 24 hours prior to departure.",
+    "Check-in counters close 60 minutes before departure for international flights and 45 minutes for domestic flights. Please report early to allow sufficient time for security screening.",
+    "A valid, government-issued photo ID is mandatory for all passengers, including infants, at check-in.",
+    "For international travel, ensure your passport has at least 6 months of validity from your date of travel and that you possess any required visas or transit documents for your destination and layovers.",
+    "Cabin baggage is limited to 1 piece weighing up to 8kg, with dimensions not exceeding 55x35x25 cm. One personal item, such as a laptop bag or handbag, is also permitted.",
+    "The standard checked baggage allowance is 1 piece weighing up to 23kg. Any single bag weighing over 32kg will not be accepted.",
+    "Excess baggage will be chargeable at prevailing airport rates. Contact Travaky Airlines for details on pre-purchasing extra baggage allowance.",
+    "This e-ticket is non-transferable. Any changes to your travel date or routing are subject to airline rules, may incur fees, and will require payment of any fare difference.",
+    "Carriage of dangerous goods like explosives, compressed gases, flammable items, corrosives, or radioactive materials is strictly prohibited in either checked or cabin baggage.",
+    "Travaky Airlines is not liable for any loss or damage to fragile, valuable, or perishable items (e.g., jewelry, electronics, cash, important documents) included in your checked baggage.",
+    "In case of flight cancellation or a major delay, you will be re-booked on the next available flight as per our Conditions of Carriage. Please contact our ground staff for assistance.",
+    "This booking is governed by Travaky Airlines' Conditions of Carriage, which are available on our website.",
+)
+FLIGHT_FOOTER = "Manage your booking online at support.travaky.com | Helpline: +1-800-TRAVAKY"
+HOTEL_DISCLAIMER = "This is a dummy document generated for demonstration purposes. Manage your booking at support.streamlit.app."
+
+@functools.lru_cache(maxsize=None)
+def _layout_lines(text: str, family: str, style: str, size: float, width: float) -> tuple:
+    """Wraps `text` to `width` once; core font metrics are the same for every document."""
+    scratch = FPDF()
+    scratch.add_page()
+    scratch.set_font(family, style, size)
+    return tuple(scratch.multi_cell(width, 1, text, dry_run=True, output=MethodReturnValue.LINES))
+
+def _stamp_block(pdf: FPDF, text: str, w: float, h: float, align: str = 'L'):
+    """Replays a pre-wrapped static block at the current position, like multi_cell(w, h, text, 0, align)."""
+    if w == 0:
+        w = pdf.w - pdf.r_margin - pdf.get_x()
+    x = pdf.get_x()
+    for line in _layout_lines(text, pdf.font_family, pdf.font_style, pdf.font_size_pt, w):
+        pdf.set_x(x)
+        pdf.cell(w, h, line, 0, align=align, new_x=XPos.RIGHT, new_y=YPos.NEXT)
+
 # --- PDF CREATION FUNCTIONS ---
 
-def create_flight_ticket_pdf(data: dict) -> bytes:
-    """Generates a flight ticket PDF using manually entered data."""
+def _airline(leg) -> str:
+    return 'Travaky Airlines' if leg.airline is None else leg.airline
+
+@metrics.timed('render')
+def create_flight_ticket_pdf(data: dict, itinerary: Itinerary | None = None, sink=None) -> bytes | int:
+    """Generates a flight ticket PDF using manually entered data (normalized once into an Itinerary)."""
     pdf = PDF(orientation='P', unit='mm', format='A4')
+    _draw_flight_ticket(pdf, data, itinerary or Itinerary.from_form_data(data))
+    return _output(pdf, sink)
+
+def _draw_flight_ticket(pdf: PDF, data: dict, itin: Itinerary, section: str | None = None):
     pdf.set_auto_page_break(auto=True, margin=15)
     pdf.set_font('Arial', '', 12)
     pdf.add_page()
+    if section: pdf.start_section(section)
+    rng = _record_rng(pdf, data)
 
     # --- Data Setup ---
-    main_passenger = data.get('passenger_name', 'N/A')
-    hometown = data.get('hometown', 'Home City')
-    all_passengers = [main_passenger] + [p['name'] for p in data.get('family_members', [])]
-    trip_id = data.get('uuid', str(uuid.uuid4())).split('-')[0].upper()
-    
-    # Use the full trip data directly
-    sorted_trips = sorted(data.get('trips', []), key=lambda x: x['arrival_date'])
-    
-    manual_cost_per_person = data.get('flight_cost', 0.0)
+    legs, all_passengers, trip_id = itin.legs, itin.passenger_names, itin.trip_id
 
     def draw_line_separator(pdf_obj):
         pdf_obj.ln(4); pdf_obj.set_draw_color(220, 220, 220)
         pdf_obj.cell(0, 0, '', 'T', 1); pdf_obj.ln(4)
 
     # --- Header ---
-    primary_airline = sorted_trips[0].get('airline', 'Travaky Airlines') if sorted_trips else 'Travaky Airlines'
+    primary_airline = _airline(legs[0]) if legs else 'Travaky Airlines'
     pdf.set_font('Arial', 'B', 18); pdf.cell(0, 10, f'{primary_airline} -Ticket Confirmation', 0, 1, 'L')
     pdf.set_font('Arial', '', 12); pdf.cell(0, 10, f"Trip ID: {trip_id}", 0, 1, 'L')
     
-    if sorted_trips:
-        origin_city, dest_city = hometown, sorted_trips[-1]['country']
-        first_pnr = sorted_trips[0].get('pnr', 'N/A')
-        start_date_obj = sorted_trips[0]['arrival_date']
-        date_str = start_date_obj.strftime('%a, %d %b %Y')
+    if legs:
+        origin_city, dest_city = itin.hometown, itin.final_destination
+        first_pnr = legs[0].pnr
         pdf.set_font('Arial', 'B', 16); pdf.cell(0, 10, f"{origin_city} to {dest_city}", 0, 1, 'L')
         pdf.set_font('Arial', '', 10); pdf.cell(0, 5, f"Primary PNR: {first_pnr}", 0, 1, 'L')
     draw_line_separator(pdf)
 
     # --- Flight Legs using Manual Data ---
-    for i, trip in enumerate(sorted_trips):
-        start_date_obj = trip['arrival_date']
-        airline_name = trip.get('airline', 'Travaky Airlines')
+    for i, leg in enumerate(legs):
+        pdf.set_font('Arial', 'B', 12); pdf.cell(80, 8, _airline(leg), 0, 0, 'L')
+        pdf.set_font('Arial', 'B', 10); pdf.cell(0, 8, f"PNR: {leg.pnr}", 0, 1, 'R')
         
-        pdf.set_font('Arial', 'B', 12); pdf.cell(80, 8, airline_name, 0, 0, 'L')
-        pdf.set_font('Arial', 'B', 10); pdf.cell(0, 8, f"PNR: {trip.get('pnr', 'N/A')}", 0, 1, 'R')
-        
-        pdf.set_font('Arial', '', 10); pdf.cell(0, 6, f"Flight {trip.get('flight_no', 'N/A')} | Fare type: Saver", 0, 1, 'L')
+        pdf.set_font('Arial', '', 10); pdf.cell(0, 6, f"Flight {leg.flight_no} | Fare type: Saver", 0, 1, 'L')
         y_before_times = pdf.get_y()
         
-        pdf.set_font('Arial', 'B', 16); pdf.cell(50, 8, trip.get('dep_time', 'N/A'), 0, 0, 'L')
+        pdf.set_font('Arial', 'B', 16); pdf.cell(50, 8, leg.dep_time, 0, 0, 'L')
         pdf.cell(20, 8, "-->", 0, 0, 'C')
-        pdf.set_font('Arial', 'B', 16); pdf.cell(50, 8, trip.get('arr_time', 'N/A'), 0, 1, 'L')
+        pdf.set_font('Arial', 'B', 16); pdf.cell(50, 8, leg.arr_time, 0, 1, 'L')
         
         pdf.set_y(y_before_times + 6); pdf.set_font('Arial', '', 10)
-        origin = hometown if i == 0 else sorted_trips[i-1]['country']
-        pdf.cell(50, 8, origin, 0, 0, 'L'); pdf.cell(20, 8, "", 0, 0, 'C'); pdf.cell(50, 8, trip['country'], 0, 1, 'L')
+        pdf.cell(50, 8, leg.origin, 0, 0, 'L'); pdf.cell(20, 8, "", 0, 0, 'C'); pdf.cell(50, 8, leg.destination, 0, 1, 'L')
         
-        pdf.ln(2); seats = ", ".join([f"{random.randint(10,40)}{random.choice('ABCDEF')}" for _ in all_passengers])
-        pdf.multi_cell(0, 5, f"Date: {start_date_obj.strftime('%a, %d %b %Y')}\nSeats - {seats}", 0, 'L')
-        if i < len(sorted_trips) - 1: draw_line_separator(pdf)
+        pdf.ln(2); seats = ", ".join([f"{rng.randint(10,40)}{rng.choice('ABCDEF')}" for _ in all_passengers])
+        pdf.multi_cell(0, 5, f"Date: {leg.arrival_date.strftime('%a, %d %b %Y')}\nSeats - {seats}", 0, 'L')
+        if i < len(legs) - 1: draw_line_separator(pdf)
 
     # --- Travellers List using Manual E-Ticket ---
     draw_line_separator(pdf); pdf.set_font('Arial', 'B', 11); pdf.set_fill_color(240, 240, 240)
     pdf.cell(140, 8, "TRAVELLERS", 1, 0, 'L', fill=True); pdf.cell(50, 8, "E-TICKET NO.", 1, 1, 'C', fill=True)
 
+    ticket_no = legs[0].ticket_no if legs else 'N/A'
     for i, name in enumerate(all_passengers):
-        ticket_no = sorted_trips[0].get('ticket_no', 'N/A') if sorted_trips else 'N/A'
-        
-        code128 = barcode.get_barcode_class('code128'); barcode_obj = code128(ticket_no, writer=ImageWriter())
-        buffer = io.BytesIO(); barcode_obj.write(buffer); buffer.seek(0)
-        y_before = pdf.get_y(); pdf.set_font('Arial', '', 11)
+        pdf.set_font('Arial', '', 11)
         pdf.cell(80, 12, f"  {name.upper()}", 'L', 0, 'L'); pdf.cell(60, 12, "", 'B', 0, 'C'); pdf.cell(50, 12, ticket_no, 'R', 1, 'C')
-        pdf.image(buffer, x=pdf.get_x() + 80, y=y_before + 2, h=8)
+        # Bars are drawn as vector rectangles straight onto the page; no raster image per passenger.
+        if ticket_no: pdf_barcodes.draw_code128(pdf, ticket_no, x=pdf.l_margin + 82, y=pdf.get_y() - 10, w=56, h=8)
     pdf.cell(0, 0, '', 'T', 1)
     
     # --- Fare Breakup using Manual Cost ---
     draw_line_separator(pdf); pdf.set_font('Arial', 'B', 11); pdf.cell(0, 8, "FARE BREAKUP", 0, 1, 'L'); pdf.set_font('Arial', '', 10)
-    base_fare = manual_cost_per_person * len(all_passengers)
-    taxes = base_fare * 0.18
-    total = base_fare + taxes
+    base_fare, taxes, total = itin.base_fare, itin.taxes, itin.total_fare
     pdf.cell(120, 6, "Base Fare:", 0, 0, 'L'); pdf.cell(0, 6, f"$ {base_fare:,.2f}", 0, 1, 'R')
     pdf.cell(120, 6, "Taxes and Surcharges:", 0, 0, 'L'); pdf.cell(0, 6, f"$ {taxes:,.2f}", 0, 1, 'R')
     pdf.set_font('Arial', 'B', 10); pdf.cell(120, 8, "Total Fare (USD):", 'T', 0, 'L'); pdf.cell(0, 8, f"$ {total:,.2f}", 'T', 1, 'R')
@@ -108,132 +226,162 @@ def create_flight_ticket_pdf(data: dict) -> bytes:
     draw_line_separator(pdf); pdf.set_font('Arial', 'B', 11); pdf.cell(0, 8, "IMPORTANT INFORMATION", 0, 1, 'L')
     pdf.set_font('Arial', '', 8)
     
-    rules_text = (
-        "- All timings are local to the respective airport. Please verify flight times with the airline 24 hours prior to departure.\n"
-        "- Check-in counters close 60 minutes before departure for international flights and 45 minutes for domestic flights. Please report early to allow sufficient time for security screening.\n"
-        "- A valid, government-issued photo ID is mandatory for all passengers, including infants, at check-in.\n"
-        "- For international travel, ensure your passport has at least 6 months of validity from your date of travel and that you possess any required visas or transit documents for your destination and layovers.\n"
-        "- Cabin baggage is limited to 1 piece weighing up to 8kg, with dimensions not exceeding 55x35x25 cm. One personal item, such as a laptop bag or handbag, is also permitted.\n"
-        "- The standard checked baggage allowance is 1 piece weighing up to 23kg. Any single bag weighing over 32kg will not be accepted.\n"
-        "- Excess baggage will be chargeable at prevailing airport rates. Contact Travaky Airlines for details on pre-purchasing extra baggage allowance.\n"
-        "- This e-ticket is non-transferable. Any changes to your travel date or routing are subject to airline rules, may incur fees, and will require payment of any fare difference.\n"
-        "- Carriage of dangerous goods like explosives, compressed gases, flammable items, corrosives, or radioactive materials is strictly prohibited in either checked or cabin baggage.\n"
-        "- Travaky Airlines is not liable for any loss or damage to fragile, valuable, or perishable items (e.g., jewelry, electronics, cash, important documents) included in your checked baggage.\n"
-        "- In case of flight cancellation or a major delay, you will be re-booked on the next available flight as per our Conditions of Carriage. Please contact our ground staff for assistance.\n"
-        "- This booking is governed by Travaky Airlines' Conditions of Carriage, which are available on our website."
-    )
-    
-    rules_list = rules_text.split('\n')
     pdf.ln(1)
-    for rule in rules_list:
-        text_to_display = rule.strip().lstrip('-').strip()
-        if not text_to_display:
-            continue
+    text_width = pdf.w - pdf.l_margin - pdf.r_margin - 4
+    for rule in FLIGHT_RULES:
         pdf.cell(4, 4, '-', 0, 0, 'C')
-        text_width = pdf.w - pdf.l_margin - pdf.r_margin - 4
-        pdf.multi_cell(text_width, 4, text_to_display, 0, 'L')
+        _stamp_block(pdf, rule, text_width, 4)
         pdf.set_y(pdf.get_y() + 1)
         
     draw_line_separator(pdf); pdf.set_font('Arial', '', 10)
-    pdf.cell(0, 8, "Manage your booking online at support.travaky.com | Helpline: +1-800-TRAVAKY", 0, 1, 'C')
-    
-    return bytes(pdf.output(dest='S'))
+    pdf.cell(0, 8, FLIGHT_FOOTER, 0, 1, 'C')
 
-def create_hotel_booking_pdf(data: dict) -> bytes:
+@metrics.timed('render')
+def create_hotel_booking_pdf(data: dict, itinerary: Itinerary | None = None, sink=None) -> bytes | int:
     """Generates a hotel booking confirmation PDF for one or more hotel stays."""
     pdf = PDF(orientation='P', unit='mm', format='A4')
+    _draw_hotel_booking(pdf, data, itinerary or Itinerary.from_form_data(data))
+    return _output(pdf, sink)
+
+def _draw_hotel_booking(pdf: PDF, data: dict, itin: Itinerary, section: str | None = None):
     pdf.set_auto_page_break(auto=True, margin=15)
     pdf.add_page()
+    if section: pdf.start_section(section)
     pdf.title_text = "Hotel Booking Confirmation"
-    main_passenger, num_guests, trip_id = data.get('passenger_name', 'N/A'), len([data.get('passenger_name')] + [p['name'] for p in data.get('family_members', [])]), data.get('uuid', str(uuid.uuid4())).split('-')[0].upper()
-    selected_stays = data.get('selected_hotels_per_trip', [])
+    _record_rng(pdf, data)
+    trip_id, selected_stays = itin.trip_id, itin.stays
 
     def draw_line_separator(pdf_obj, margin_top=4, margin_bottom=4):
         pdf_obj.ln(margin_top); pdf_obj.set_draw_color(220, 220, 220); pdf_obj.cell(0, 0, '', 'T', 1); pdf_obj.ln(margin_bottom)
 
     if not selected_stays:
-        pdf.set_font('Arial', 'B', 12); pdf.cell(0, 10, "No hotel stay was selected for this itinerary.", 0, 1, 'C'); return bytes(pdf.output(dest='S'))
+        pdf.set_font('Arial', 'B', 12); pdf.cell(0, 10, "No hotel stay was selected for this itinerary.", 0, 1, 'C'); return
 
     pdf.set_font('Arial', 'B', 16); pdf.cell(0, 10, f"Your {len(selected_stays)} Booking(s) are Confirmed!", 0, 1, 'C')
     pdf.set_font('Arial', '', 10); pdf.cell(0, 5, f"Booking Itinerary ID: {trip_id}-HTL", 0, 1, 'C'); pdf.ln(5)
 
     for i, stay in enumerate(selected_stays):
-        hotel, trip = stay['hotel_data'], stay['trip_data']
-        check_in_obj, check_out_obj = trip['arrival_date'], trip['departure_date']
-        num_nights = (check_out_obj - check_in_obj).days if (check_out_obj - check_in_obj).days > 0 else 1
         draw_line_separator(pdf)
-        pdf.set_font('Arial', 'B', 14); pdf.cell(0, 8, f"Stay {i+1}: {hotel['Hotel Name']}", 0, 1, 'L')
-        pdf.set_font('Arial', '', 11); pdf.cell(0, 6, f"{hotel['City']}, {hotel['Country']}", 0, 1, 'L'); pdf.ln(3)
+        pdf.set_font('Arial', 'B', 14); pdf.cell(0, 8, f"Stay {i+1}: {stay.hotel_name}", 0, 1, 'L')
+        pdf.set_font('Arial', '', 11); pdf.cell(0, 6, f"{stay.city}, {stay.country}", 0, 1, 'L'); pdf.ln(3)
         col_width = pdf.w / 2 - pdf.l_margin - 5
         pdf.set_font('Arial', 'B', 11); pdf.cell(col_width, 7, "Check-in", 0, 0, 'L'); pdf.cell(col_width, 7, "Check-out", 0, 1, 'L')
-        pdf.set_font('Arial', '', 11); pdf.cell(col_width, 7, check_in_obj.strftime('%a, %d %b %Y'), 0, 0, 'L'); pdf.cell(col_width, 7, check_out_obj.strftime('%a, %d %b %Y'), 0, 1, 'L')
+        pdf.set_font('Arial', '', 11); pdf.cell(col_width, 7, stay.check_in.strftime('%a, %d %b %Y'), 0, 0, 'L'); pdf.cell(col_width, 7, stay.check_out.strftime('%a, %d %b %Y'), 0, 1, 'L')
         pdf.set_font('Arial', 'B', 11); pdf.cell(col_width, 7, "Total Nights", 0, 0, 'L'); pdf.cell(col_width, 7, "Guests", 0, 1, 'L')
-        pdf.set_font('Arial', '', 11); pdf.cell(col_width, 7, str(num_nights), 0, 0, 'L'); pdf.cell(col_width, 7, str(num_guests), 0, 1, 'L'); pdf.ln(5)
-        nightly_rate = float(hotel.get('Rate', 0)); total_cost = nightly_rate * num_nights * num_guests
+        pdf.set_font('Arial', '', 11); pdf.cell(col_width, 7, str(stay.nights), 0, 0, 'L'); pdf.cell(col_width, 7, str(stay.guests), 0, 1, 'L'); pdf.ln(5)
         pdf.set_font('Arial', 'B', 12); pdf.cell(0, 8, "Price Summary for this Stay", 0, 1, 'L')
-        pdf.set_font('Arial', '', 11); pdf.cell(130, 7, "Nightly Rate (per guest)", 0, 0, 'L'); pdf.cell(0, 7, f"EUR {nightly_rate:,.2f}", 0, 1, 'R')
-        pdf.cell(130, 8, "Total Stay Cost", 'T', 0, 'L'); pdf.cell(0, 8, f"EUR {total_cost:,.2f}", 'T', 1, 'R'); pdf.ln(5)
+        pdf.set_font('Arial', '', 11); pdf.cell(130, 7, "Nightly Rate (per guest)", 0, 0, 'L'); pdf.cell(0, 7, f"EUR {stay.nightly_rate:,.2f}", 0, 1, 'R')
+        pdf.cell(130, 8, "Total Stay Cost", 'T', 0, 'L'); pdf.cell(0, 8, f"EUR {stay.total_cost:,.2f}", 'T', 1, 'R'); pdf.ln(5)
 
-    pdf.set_y(-30); pdf.set_font('Arial', 'I', 9); pdf.multi_cell(0, 5, "This is a dummy document generated for demonstration purposes. Manage your booking at support.streamlit.app.", 0, 'C')
-    return bytes(pdf.output(dest='S'))
+    pdf.set_y(-30); pdf.set_font('Arial', 'I', 9); _stamp_block(pdf, HOTEL_DISCLAIMER, 0, 5, 'C')
 
-def create_itinerary_pdf(data: dict) -> bytes:
+@metrics.timed('render')
+def create_itinerary_pdf(data: dict, itinerary: Itinerary | None = None, sink=None) -> bytes | int:
     """Generates an itinerary PDF using manually entered data."""
     pdf = PDF(orientation='P', unit='mm', format='A4')
+    _draw_itinerary(pdf, data, itinerary or Itinerary.from_form_data(data))
+    return _output(pdf, sink)
+
+def _draw_itinerary(pdf: PDF, data: dict, itin: Itinerary, section: str | None = None):
     pdf.set_auto_page_break(auto=True, margin=10)
     pdf.set_font('Arial', '', 12)
     pdf.add_page()
-    main_passenger, hometown = data.get('passenger_name', 'N/A').upper(), data.get('hometown', 'Home City')
-    sorted_trips = sorted(data.get('trips', []), key=lambda x: x['arrival_date'])
+    if section: pdf.start_section(section)
+    rng = _record_rng(pdf, data)
+    main_passenger, legs = itin.passenger_name.upper(), itin.legs
     AIRPORT_CODES = {'France': 'CDG', 'Germany': 'FRA', 'Italy': 'FCO', 'Spain': 'MAD', 'USA': 'JFK', 'Dubai': 'DXB'}
 
     def draw_line_separator(pdf_obj):
         pdf_obj.ln(2); pdf_obj.set_draw_color(180, 180, 180); pdf_obj.cell(0, 0, '', 'T', 1); pdf_obj.ln(2)
 
-    if sorted_trips:
-        start_date_obj, end_date_obj = sorted_trips[0]['arrival_date'], sorted_trips[-1]['departure_date']
-        start_str, end_str = start_date_obj.strftime('%d %b %Y').upper(), end_date_obj.strftime('%d %b %Y').upper()
-        dest_str = sorted_trips[-1]['country'].upper()
+    if legs:
+        start_str, end_str = itin.start_date.strftime('%d %b %Y').upper(), itin.end_date.strftime('%d %b %Y').upper()
+        dest_str = itin.final_destination.upper()
         pdf.set_font('Arial', 'B', 11); pdf.set_fill_color(220, 220, 220); pdf.cell(80, 7, f"{start_str}   {end_str}", 1, 0, 'C', fill=True); pdf.cell(0, 7, f"TRIP TO {dest_str}", 1, 1, 'C', fill=True)
     pdf.ln(5)
     
-    pnr, airline_code = (sorted_trips[0].get('pnr', 'N/A'), sorted_trips[0].get('airline', 'TVK')[:3].upper()) if sorted_trips else ('N/A', 'TVK')
+    pnr, airline_code = (legs[0].pnr, (legs[0].airline if legs[0].airline is not None else 'TVK')[:3].upper()) if legs else ('N/A', 'TVK')
     pdf.set_font('Arial', '', 9); pdf.cell(50, 5, "PREPARED FOR", 0, 1, 'L'); pdf.set_font('Arial', 'B', 12); pdf.cell(50, 6, main_passenger, 0, 1, 'L')
     pdf.ln(3); pdf.set_font('Arial', '', 9); pdf.cell(60, 5, "RESERVATION CODE", 0, 0, 'L'); pdf.cell(60, 5, "AIRLINE RESERVATION CODE", 0, 1, 'L')
     pdf.set_font('Arial', 'B', 10); pdf.cell(60, 6, pnr, 0, 0, 'L'); pdf.cell(60, 6, f"{pnr} ({airline_code})", 0, 1, 'L'); draw_line_separator(pdf)
 
-    for i, trip in enumerate(sorted_trips):
-        start_date_obj, airline_name = trip['arrival_date'], trip.get('airline', 'Travaky Airlines')
+    for i, leg in enumerate(legs):
+        start_date_obj, airline_name = leg.arrival_date, _airline(leg)
         departure_day_str, arrival_day_str = start_date_obj.strftime('%A %d %b').upper(), (start_date_obj + datetime.timedelta(days=1)).strftime('%A %d %b').upper()
         pdf.set_font('Arial', 'B', 10); pdf.cell(0, 7, f"> DEPARTURE: {departure_day_str}  >  ARRIVAL: {arrival_day_str}", 0, 1)
         pdf.set_font('Arial', '', 8); pdf.cell(0, 4, "Please verify flight times prior to departure", 0, 1); pdf.ln(2)
         y_before_leg = pdf.get_y()
         pdf.set_font('Arial', 'B', 12); pdf.cell(45, 6, airline_name, 0, 1, 'L')
-        pdf.set_font('Arial', 'B', 14); pdf.cell(45, 8, trip.get('flight_no', 'N/A'), 0, 1, 'L'); pdf.set_y(pdf.get_y() + 5)
-        pdf.set_font('Arial', '', 9); pdf.cell(45, 5, f"Duration:\n{random.randint(7,12)}hr(s) {random.randint(0,59)}min(s)", 0, 1, 'L')
+        pdf.set_font('Arial', 'B', 14); pdf.cell(45, 8, leg.flight_no, 0, 1, 'L'); pdf.set_y(pdf.get_y() + 5)
+        pdf.set_font('Arial', '', 9); pdf.cell(45, 5, f"Duration:\n{rng.randint(7,12)}hr(s) {rng.randint(0,59)}min(s)", 0, 1, 'L')
         pdf.cell(45, 5, "Class: Economy", 0, 1, 'L'); pdf.cell(45, 5, "Status: Confirmed", 0, 1, 'L'); y_after_col1 = pdf.get_y()
         pdf.set_y(y_before_leg); pdf.set_x(55)
-        origin_country = hometown if i == 0 else sorted_trips[i-1]['country']
-        origin_code, dest_country, dest_code = ("XXX" if i == 0 else AIRPORT_CODES.get(origin_country, 'YYY')), trip['country'], AIRPORT_CODES.get(trip['country'], 'ZZZ')
+        origin_country, dest_country = leg.origin, leg.destination
+        origin_code, dest_code = ("XXX" if i == 0 else AIRPORT_CODES.get(origin_country, 'YYY')), AIRPORT_CODES.get(dest_country, 'ZZZ')
         pdf.set_font('Arial', 'B', 16); pdf.cell(50, 8, origin_code, 0, 0, 'L'); pdf.cell(10, 8, '>', 0, 0, 'C'); pdf.cell(50, 8, dest_code, 0, 1, 'L')
         pdf.set_x(55); pdf.set_font('Arial', '', 9); pdf.cell(60, 5, origin_country, 0, 0, 'L'); pdf.cell(60, 5, dest_country, 0, 1, 'L')
         pdf.set_x(55); pdf.rect(pdf.get_x(), pdf.get_y()+2, 90, 18); pdf.ln(3)
         pdf.set_x(57); pdf.cell(45, 5, "Departing At:", 0, 0, 'L'); pdf.cell(45, 5, "Arriving At:", 0, 1, 'L')
-        pdf.set_x(57); pdf.set_font('Arial', 'B', 10); pdf.cell(45, 5, trip.get('dep_time', 'N/A'), 0, 0, 'L'); pdf.cell(45, 5, trip.get('arr_time', 'N/A'), 0, 1, 'L')
+        pdf.set_x(57); pdf.set_font('Arial', 'B', 10); pdf.cell(45, 5, leg.dep_time, 0, 0, 'L'); pdf.cell(45, 5, leg.arr_time, 0, 1, 'L')
         pdf.set_x(57); pdf.set_font('Arial', '', 9); pdf.cell(45, 5, f"({start_date_obj.strftime('%a, %d %b')})", 0, 0, 'L'); pdf.cell(45, 5, f"({(start_date_obj + datetime.timedelta(days=1)).strftime('%a, %d %b')})", 0, 1, 'L')
         pdf.set_y(y_before_leg); pdf.set_x(150); pdf.set_font('Arial', '', 9); pdf.cell(0, 5, "Aircraft:", 0, 1, 'L')
-        pdf.set_x(150); pdf.set_font('Arial', 'B', 9); pdf.cell(0, 5, f"BOEING {random.choice(['777-300ER', '787-9', 'A350-900'])}", 0, 1, 'L')
+        pdf.set_x(150); pdf.set_font('Arial', 'B', 9); pdf.cell(0, 5, f"BOEING {rng.choice(['777-300ER', '787-9', 'A350-900'])}", 0, 1, 'L')
         pdf.set_y(max(y_after_col1, pdf.get_y() + 10)); pdf.set_fill_color(240, 240, 240); pdf.set_font('Arial', '', 9)
         pdf.cell(95, 7, f"Passenger Name:  » {main_passenger}", 'T', 0, 'L', fill=True); pdf.cell(95, 7, "Seats:  Check-In Required", 'T', 1, 'L', fill=True)
         draw_line_separator(pdf)
 
-    return bytes(pdf.output(dest='S'))
-
-def create_cover_letter_pdf(text: str) -> bytes:
+@metrics.timed('render')
+def create_cover_letter_pdf(text: str, sink=None) -> bytes | int:
     """Creates a PDF from the provided cover letter text."""
     pdf = PDF()
+    # Dated by day, like the letter itself, so regenerating it the same day gives the same bytes.
+    pdf.set_creation_date(_creation_date())
+    _draw_cover_letter(pdf, text)
+    return _output(pdf, sink)
+
+def _draw_cover_letter(pdf: PDF, text: str, section: str | None = None):
+    pdf.set_auto_page_break(auto=True, margin=20)  # FPDF's default, in case an earlier section changed it.
     pdf.set_font('Arial', '', 12)
     pdf.add_page()
+    if section: pdf.start_section(section)
     safe_text = text.encode('latin-1', 'replace').decode('latin-1')
     pdf.multi_cell(0, 7, safe_text)
-    return bytes(pdf.output(dest='S'))
\ No newline at end of file
+
+# --- VISA PACK ---
+
+# Section key -> outline title, in the order embassies expect them.
+VISA_PACK_SECTIONS = {
+    'cover_letter': "Cover Letter",
+    'flight_ticket': "Flight Ticket",
+    'itinerary': "Itinerary",
+    'hotel_booking': "Hotel Booking",
+}
+
+@metrics.timed('render')
+def create_visa_pack_pdf(data: dict, itinerary: Itinerary | None = None, sink=None) -> bytes | int:
+    """Renders the selected documents into one PDF with an outline entry per section.
+
+    Sections come from data['visa_pack_sections'] (default: all) and the cover letter from
+    data['cover_letter_text']; one document means fonts and resources are written once."""
+    itin = itinerary or Itinerary.from_form_data(data)
+    wanted = data.get('visa_pack_sections') or list(VISA_PACK_SECTIONS)
+    pdf = PDF(orientation='P', unit='mm', format='A4')
+    pdf.set_title(f"Visa Pack {itin.trip_id}")
+    pdf.set_creation_date(_creation_date(data))
+    for key, title in VISA_PACK_SECTIONS.items():
+        if key not in wanted:
+            continue
+        if hasattr(pdf, 'title_text'):
+            del pdf.title_text  # Only the hotel booking pages carry a running title.
+        if key == 'cover_letter':
+            if data.get('cover_letter_text'):
+                _draw_cover_letter(pdf, data['cover_letter_text'], section=title)
+        elif key == 'flight_ticket':
+            _draw_flight_ticket(pdf, data, itin, section=title)
+        elif key == 'itinerary':
+            _draw_itinerary(pdf, data, itin, section=title)
+        elif key == 'hotel_booking' and itin.stays:
+            _draw_hotel_booking(pdf, data, itin, section=title)
+    if pdf.page_no() == 0:
+        pdf.add_page()
+    return _output(pdf, sink)
@@ -0,0 +1,90 @@
+import collections
+import threading
+import time
+
+# --- HISTORY PAGES ---
+
+URL_COLUMNS = (
+    "pdf_flight_ticket_url", "pdf_hotel_booking_url", "pdf_itinerary_url", "pdf_cover_letter_url",
+    "html_flight_url", "html_hotel_url", "html_itinerary_url", "html_cover_letter_url", "pdf_visa_pack_url",
+)
+# Only what the history table shows; passport numbers, job details etc. are never fetched.
+HISTORY_COLUMNS = ("id", "created_at", "passenger_name", "trips", "family_members", "selected_hotel") + URL_COLUMNS
+
+def format_trips(trip_list) -> str:
+    if not isinstance(trip_list, list) or not trip_list: return "N/A"
+    countries = [t.get('country', 'N/A') for t in trip_list]
+    return ", ".join(countries) if countries else "N/A"
+
+def format_guests(guest_list) -> str:
+    if not isinstance(guest_list, list) or not guest_list: return "None"
+    guest_names = [g.get('name', 'N/A') for g in guest_list]
+    return ", ".join(guest_names) if guest_names else "None"
+
+def _format_row(row: dict) -> dict:
+    """Collapses the JSON trips/family_members blobs into display strings once, when the page is fetched."""
+    row = dict(row)
+    row['trips'] = format_trips(row.get('trips'))
+    row['Guests'] = format_guests(row.pop('family_members', None))
+    return row
+
+def _quote(value) -> str:
+    """Quotes a value for a PostgREST logic tree filter (timestamps contain its reserved '.' and ':')."""
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+class HistoryPage:
+    __slots__ = ('rows', 'next_cursor')
+
+    def __init__(self, rows: tuple, next_cursor: tuple | None):
+        self.rows, self.next_cursor = rows, next_cursor
+
+class HistoryBrowser:
+    """Keyset-paginated reader for travel_records with a process-wide TTL page store.
+
+    Pages are addressed by (cursor, search, page size), where the cursor is the (created_at, id) of
+    the last row on the previous page, so deep pages cost the same as the first one. id breaks ties
+    between records created in the same instant, which would otherwise be skipped or repeated."""
+
+    def __init__(self, ttl: float = 60, max_pages: int = 256):
+        self.ttl, self.max_pages = ttl, max_pages
+        self._pages = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def page(self, supabase, cursor: tuple | None = None, search: str = "", page_size: int = 25) -> HistoryPage:
+        key = (cursor, search.strip().casefold(), page_size)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._pages.get(key)
+            if cached and now - cached[0] < self.ttl:
+                self._pages.move_to_end(key)
+                return cached[1]
+
+        query = supabase.table("travel_records").select(",".join(HISTORY_COLUMNS))
+        if key[1]:
+            # Escape LIKE wildcards so the search is a plain substring match.
+            pattern = key[1].replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            query = query.ilike("passenger_name", f"%{pattern}%")
+        if cursor:
+            created_at, row_id = cursor
+            # The id stays opaque (bigint or uuid primary key alike); PostgREST casts the quoted value.
+            query = query.or_(f"created_at.lt.{_quote(created_at)},and(created_at.eq.{_quote(created_at)},id.lt.{_quote(row_id)})")
+        # One extra row tells us whether there is a next page.
+        rows = query.order("created_at", desc=True).order("id", desc=True).limit(page_size + 1).execute().data
+        last = rows[page_size - 1] if len(rows) > page_size else None
+        page = HistoryPage(
+            rows=tuple(_format_row(row) for row in rows[:page_size]),
+            next_cursor=(last['created_at'], last['id']) if last else None,
+        )
+        with self._lock:
+            self._pages[key] = (now, page)
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+        return page
+
+    def invalidate(self):
+        with self._lock:
+            self._pages.clear()
+
+# Shared by every Streamlit session in the process.
+default_browser = HistoryBrowser()
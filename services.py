@@ -1,142 +1,340 @@
-import streamlit as st
-from supabase import create_client, Client
-from groq import Groq
+from __future__ import annotations
+
+import concurrent.futures
+import dataclasses
 import datetime
+import gzip
+import hashlib
+import json
+import os
+import string
+import threading
+import time
+from typing import TYPE_CHECKING
+
+import hotel_catalogue
+import metrics
+import upload_index
+from itinerary import Itinerary
+
+if TYPE_CHECKING:
+    from groq import Groq
+    from supabase import Client
+
+try:
+    import brotli  # optional: adds .br variants of pre-compressed uploads
+except ImportError:
+    brotli = None
+
+# No UI code in this module: it is imported by the Streamlit app, batch workers and load tests
+# alike. Configuration is passed in as Settings and failures are raised as ServiceError.
+
+# --- ERRORS ---
+
+class ServiceError(Exception):
+    """A failed call to an external service; `operation` and `target` say which one."""
+
+    def __init__(self, operation: str, target: str, message: str):
+        super().__init__(f"{operation} failed for {target}: {message}")
+        self.operation, self.target = operation, target
+
+class ConfigurationError(ServiceError):
+    """A client was requested without the settings it needs."""
+
+class UploadError(ServiceError):
+    """A storage upload failed (other than the object already existing)."""
+
+class HotelCatalogueError(ServiceError):
+    """The hotel catalogue could not be fetched."""
+
+# --- CONFIGURATION ---
+
+@dataclasses.dataclass(frozen=True)
+class Settings:
+    """Connection settings for the external services."""
+    supabase_url: str | None = None
+    supabase_key: str | None = None
+    groq_api_key: str | None = None
+    # When set, Supabase and Groq are replaced by the offline stand-ins in local_backends.
+    local_backend_dir: str | None = None
+    local_llm_latency: float = 1.0
+
+    @classmethod
+    def from_env(cls, environ=None) -> Settings:
+        """SUPABASE_URL, SUPABASE_KEY, GROQ_API_KEY, TRAVAKY_LOCAL_BACKEND and TRAVAKY_LOCAL_LLM_LATENCY."""
+        env = os.environ if environ is None else environ
+        return cls(
+            supabase_url=env.get('SUPABASE_URL'), supabase_key=env.get('SUPABASE_KEY'), groq_api_key=env.get('GROQ_API_KEY'),
+            local_backend_dir=env.get('TRAVAKY_LOCAL_BACKEND'), local_llm_latency=float(env.get('TRAVAKY_LOCAL_LLM_LATENCY', '1.0')),
+        )
+
+    def with_secrets(self, secrets) -> Settings:
+        """Overrides values from a mapping shaped like .streamlit/secrets.toml ([supabase] url/key, [groq] api_key)."""
+        supabase, groq = secrets.get('supabase', {}), secrets.get('groq', {})
+        return dataclasses.replace(
+            self, supabase_url=supabase.get('url', self.supabase_url), supabase_key=supabase.get('key', self.supabase_key),
+            groq_api_key=groq.get('api_key', self.groq_api_key),
+        )
 
 # --- CLIENT INITIALIZATION ---
 
-@st.cache_resource
-def init_supabase_connection() -> Client:
-    """Initializes and returns the Supabase client."""
-    url = st.secrets["supabase"]["url"]
-    key = st.secrets["supabase"]["key"]
-    return create_client(url, key)
+def create_supabase_client(settings: Settings) -> Client:
+    """Creates the Supabase client (or its local stand-in); the supabase package is imported only here."""
+    if settings.local_backend_dir:
+        import local_backends
+        return local_backends.LocalSupabase(settings.local_backend_dir)
+    if not (settings.supabase_url and settings.supabase_key):
+        raise ConfigurationError("connect", "supabase", "no URL/key configured")
+    from supabase import create_client
+    return create_client(settings.supabase_url, settings.supabase_key)
 
-@st.cache_resource
-def init_groq_client() -> Groq:
-    """Initializes and returns the Groq LLM client."""
-    return Groq(api_key=st.secrets["groq"]["api_key"])
+def create_llm_client(settings: Settings) -> Groq | None:
+    """Creates the Groq client (or its local stand-in); None when no API key is configured."""
+    if settings.local_backend_dir:
+        import local_backends
+        return local_backends.CannedLLM(latency=settings.local_llm_latency)
+    if not settings.groq_api_key:
+        return None
+    from groq import Groq
+    return Groq(api_key=settings.groq_api_key)
 
 # --- HELPER FUNCTIONS ---
 
-def upload_and_get_url(supabase: Client, file_bytes: bytes, bucket_name: str, file_path: str, content_type: str) -> str | None:
-    """Uploads a file to a Supabase bucket with a specific content type and returns its public URL."""
+def upload_file(supabase: Client, file_bytes: bytes, bucket_name: str, file_path: str, content_type: str,
+                index: upload_index.UploadIndex | None = None, cache_control: str | None = None, metadata: dict | None = None) -> str:
+    """Uploads a file and returns its public URL, reusing an existing object; raises UploadError on any other failure.
+
+    Bytes already uploaded to this bucket (same SHA-256 and content type) are not sent again: the
+    URL of the stored copy comes from the upload index, which may point at another record's path.
+    An existing object at `file_path` with different bytes is overwritten, and the index stops
+    handing out its URL for the old bytes.
+    cache_control is in seconds (served as max-age); metadata is stored as the object's user metadata."""
+    index = upload_index.default_index if index is None else index
+    project, digest = getattr(supabase, 'supabase_url', ''), hashlib.sha256(file_bytes).hexdigest()
+    url = index.get(project, bucket_name, digest, content_type)
+    if url:
+        if metrics.registry.enabled:
+            metrics.registry.observe('upload_skipped', file_path.rsplit('/', 1)[-1], 0.0, len(file_bytes))
+        return url
+
+    bucket = supabase.storage.from_(bucket_name)
+    file_options = {"content-type": content_type}
+    if cache_control:
+        file_options["cache-control"] = cache_control
+    if metadata:
+        file_options["metadata"] = metadata
     try:
-        supabase.storage.from_(bucket_name).upload(
-            file=file_bytes,
-            path=file_path,
-            # This line now uses the 5th argument correctly
-            file_options={"content-type": content_type} 
-        )
-        return supabase.storage.from_(bucket_name).get_public_url(file_path)
+        with metrics.timer('upload', file_path.rsplit('/', 1)[-1], size=len(file_bytes)):
+            bucket.upload(file=file_bytes, path=file_path, file_options=file_options)
     except Exception as e:
-        if "Duplicate" in str(e):
-            st.warning(f"File {file_path} already exists. Reusing.")
-            return supabase.storage.from_(bucket_name).get_public_url(file_path)
-        else:
-            st.error(f"Upload Error for {file_path}: {e}")
-            return None
-
-
-# In services.py, replace the existing function with this one.
-
-def generate_cover_letter_text(llm_client: Groq, data: dict) -> str:
-    """Generates a professional visa cover letter using a strict, user-provided template."""
-    
-    # --- Prepare Data ---
-    today_date = datetime.date.today().strftime("%d/%m/%Y")
-    full_name = data.get('passenger_name', '[Your Full Name]')
-    
-    main_country, start_date_str, end_date_str = "your destination", "[Start Date]", "[End Date]"
-    if data.get('trips'):
-        sorted_trips = sorted(data['trips'], key=lambda x: x['arrival_date'])
-        main_country = sorted_trips[0]['country']
-        start_date_obj = sorted_trips[0]['arrival_date']
-        end_date_obj = sorted_trips[-1]['departure_date']
-        start_date_str = start_date_obj.strftime('%d %B %Y')
-        end_date_str = end_date_obj.strftime('%d %B %Y')
-
-    job_title = data.get('job_title', '[Your Job Title]')
-    company_name = data.get('company_name', '[Company Name]')
-    joining_date_str = str(data.get('joining_date', '[Joining Date]'))
-    
-    # Use the new phone number field
-    contact_no = data.get('phone_number', '[XXXXXXXXX]')
-
-    # --- THIS IS THE NEW, STRICT PROMPT ---
-    # It explicitly forbids any extra text, comments, or descriptions.
-    prompt = f"""You are a silent text-replacement tool. Your ONLY job is to fill the placeholders in the provided template with the provided data.
-    DO NOT add any conversational text like "Here is the letter...".
-    DO NOT add any descriptions of formatting like "[Front page]" or "[Ocean blue background]".
-    DO NOT add any extra placeholders like "[Signature]".
-    Produce ONLY the raw, filled-in letter text and nothing else.
+        if "Duplicate" not in str(e):
+            raise UploadError("upload", f"{bucket_name}/{file_path}", str(e)) from e
+        # The path already holds an object: keep it if it has the same bytes, otherwise replace it.
+        try:
+            if hashlib.sha256(bucket.download(file_path)).hexdigest() != digest:
+                with metrics.timer('upload', file_path.rsplit('/', 1)[-1], size=len(file_bytes)):
+                    bucket.update(path=file_path, file=file_bytes, file_options=file_options)
+                # Other records were given this URL for the old bytes; it now serves these instead.
+                index.discard_url(project, bucket_name, bucket.get_public_url(file_path))
+        except Exception as e:
+            raise UploadError("replace", f"{bucket_name}/{file_path}", str(e)) from e
+    url = bucket.get_public_url(file_path)
+    index.put(project, bucket_name, digest, content_type, url)
+    return url
+
+def upload_with_retry(supabase: Client, file_bytes: bytes, bucket_name: str, file_path: str, content_type: str,
+                      attempts: int = 3, backoff: float = 0.5, **options) -> str:
+    """Like upload_file (options are passed through), but retries transient failures with exponential backoff.
+    Safe to call from worker threads."""
+    for attempt in range(attempts):
+        try:
+            return upload_file(supabase, file_bytes, bucket_name, file_path, content_type, **options)
+        except Exception:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(backoff * 2 ** attempt)
+
+# --- PRE-COMPRESSION ---
 
-    Data to use:
-    - [DD/MM/YYYY]: {today_date}
-    - [Country Name]: {main_country}
-    - [Your Full Name]: {full_name}
-    - [Start Date]: {start_date_str}
-    - [End Date]: {end_date_str}
-    - [Your Job Title]: {job_title}
-    - [Company Name]: {company_name}
-    - [Joining Date]: {joining_date_str}
-    - [XXXXXXXXX]: {contact_no}
+# Only content-hashed paths (the shared theme) are write-once; record paths keep their name when
+# an edited document replaces them, so they get no long-lived caching. Supabase serves this as
+# Cache-Control: max-age.
+IMMUTABLE_CACHE_CONTROL = "31536000"
+# Pre-compressed siblings are stored at the object's path plus this suffix, for a CDN or proxy
+# in front of storage to serve with the matching Content-Encoding. Storage alone never serves
+# them, so they are only compressed and uploaded when TRAVAKY_PRECOMPRESSED_VARIANTS=1 says such
+# a CDN is configured.
+ENCODING_SUFFIXES = {'gzip': '.gz', 'br': '.br'}
+PRECOMPRESSED_VARIANTS = os.environ.get('TRAVAKY_PRECOMPRESSED_VARIANTS', '0') == '1'
 
-    --- TEMPLATE ---
-    Date: {today_date}
+def compress_variants(content: bytes) -> dict:
+    """Content-Encoding -> compressed bytes: gzip, plus brotli if installed; only variants smaller than `content`.
 
-    To,
-    The Visa Officer
-    Embassy of {main_country}
+    Compressed once, at maximum level, when the document is generated. gzip output has no
+    timestamp, so identical documents give identical bytes and the upload index skips repeats."""
+    variants = {'gzip': gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(content, mode=brotli.MODE_TEXT)
+    return {encoding: data for encoding, data in variants.items() if len(data) < len(content)}
 
-    Subject: Tourist Visa Application
+def upload_precompressed(supabase: Client, file_bytes: bytes, variants: dict | None, bucket_name: str, file_path: str,
+                         content_type: str, immutable: bool = False) -> str:
+    """Uploads a document and, when PRECOMPRESSED_VARIANTS is set, its pre-compressed variants; returns the document's URL.
 
-    Dear Sir/Madam,
+    immutable (for content-hashed paths only) adds long-lived caching. A failed variant upload is
+    skipped: the uncompressed document is still served."""
+    cache_control = IMMUTABLE_CACHE_CONTROL if immutable else None
+    url = upload_with_retry(supabase, file_bytes, bucket_name, file_path, content_type, cache_control=cache_control)
+    if not PRECOMPRESSED_VARIANTS:
+        return url
+    for encoding, data in (variants or {}).items():
+        try:
+            upload_with_retry(supabase, data, bucket_name, file_path + ENCODING_SUFFIXES[encoding], content_type,
+                              cache_control=cache_control, metadata={'content-encoding': encoding})
+        except UploadError:
+            pass
+    return url
 
-    I am writing to submit my application for a short-term tourist visa to visit {main_country} from {start_date_str} to {end_date_str}.
+# --- COVER LETTER ---
 
-    This trip is purely for tourism purposes. I plan to explore a few major cities and cultural landmarks during this time. My aim is to learn more about the country's history, architecture, and way of life, while taking a short break from my professional routine in India.
+# Every placeholder is computed in Python, so the letter is filled locally. The LLM is only
+# used when the user explicitly asks for the wording to be polished.
+COVER_LETTER_TEMPLATE = string.Template("""Date: $today_date
 
-    I am currently working as a {job_title} with {company_name} and have been employed here since {joining_date_str}. My leave for this trip has already been approved, and I am financially prepared to support all travel-related expenses on my own. My travel insurance, round-trip flight bookings, hotel reservations, and detailed travel plan are included in the application.
+To,
+The Visa Officer
+Embassy of $main_country
 
-    I understand the importance of following visa regulations and assure you that I will fully comply with the terms of the visa. I have strong ties to India, both professionally and personally, and I will be returning after my visit as scheduled.
+Subject: Tourist Visa Application
 
-    Please find below the list of documents enclosed with this application:
+Dear Sir/Madam,
 
-    -Completed visa application form
-    -Passport with required validity
-    -Flight and hotel bookings
-    -Proof of travel insurance
-    -Leave approval from employer
-    -Bank statements and ITRs
-    -Day-wise travel itinerary
-    -This covering letter
+I am writing to submit my application for a short-term tourist visa to visit $main_country from $start_date to $end_date.
 
-    I hope you find everything in order, and I remain available for any further clarification if needed.
+This trip is purely for tourism purposes. I plan to explore a few major cities and cultural landmarks during this time. My aim is to learn more about the country's history, architecture, and way of life, while taking a short break from my professional routine in India.
 
-    Thank you for considering my request.
+I am currently working as a $job_title with $company_name and have been employed here since $joining_date. My leave for this trip has already been approved, and I am financially prepared to support all travel-related expenses on my own. My travel insurance, round-trip flight bookings, hotel reservations, and detailed travel plan are included in the application.
 
-    Sincerely,
-    {full_name}
-    Contact No.: {contact_no}
+I understand the importance of following visa regulations and assure you that I will fully comply with the terms of the visa. I have strong ties to India, both professionally and personally, and I will be returning after my visit as scheduled.
+
+Please find below the list of documents enclosed with this application:
+
+-Completed visa application form
+-Passport with required validity
+-Flight and hotel bookings
+-Proof of travel insurance
+-Leave approval from employer
+-Bank statements and ITRs
+-Day-wise travel itinerary
+-This covering letter
+
+I hope you find everything in order, and I remain available for any further clarification if needed.
+
+Thank you for considering my request.
+
+Sincerely,
+$full_name
+Contact No.: $contact_no
+""")
+
+def _cover_letter_fields(data: dict, itinerary: Itinerary | None = None) -> dict:
+    """Computes the values for every placeholder in the cover letter template."""
+    main_country, start_date_str, end_date_str = "your destination", "[Start Date]", "[End Date]"
+    legs = (itinerary or Itinerary.from_form_data(data)).legs
+    if legs:
+        main_country = legs[0].destination
+        start_date_str = legs[0].arrival_date.strftime('%d %B %Y')
+        end_date_str = legs[-1].departure_date.strftime('%d %B %Y')
+    return {
+        'today_date': datetime.date.today().strftime("%d/%m/%Y"),
+        'full_name': data.get('passenger_name', '[Your Full Name]'),
+        'main_country': main_country, 'start_date': start_date_str, 'end_date': end_date_str,
+        'job_title': data.get('job_title', '[Your Job Title]'),
+        'company_name': data.get('company_name', '[Company Name]'),
+        'joining_date': str(data.get('joining_date', '[Joining Date]')),
+        'contact_no': data.get('phone_number', '[XXXXXXXXX]'),
+    }
+
+def render_cover_letter_text(data: dict, itinerary: Itinerary | None = None) -> str:
+    """Fills the visa cover letter template locally, without any network call."""
+    return COVER_LETTER_TEMPLATE.safe_substitute(_cover_letter_fields(data, itinerary))
+
+class _SingleFlightMemo:
+    """Shares one in-flight computation per key between all callers and keeps the result for `ttl` seconds."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}  # key -> (expires_at, Future)
+
+    def get_or_compute(self, key: str, compute):
+        now = time.monotonic()
+        with self._lock:
+            for stale_key in [k for k, (expires_at, _) in self._entries.items() if expires_at <= now]:
+                del self._entries[stale_key]
+            entry = self._entries.get(key)
+            owner = entry is None
+            if owner:
+                entry = (now + self.ttl, concurrent.futures.Future())
+                self._entries[key] = entry
+        future = entry[1]
+        if owner:
+            try:
+                future.set_result(compute())
+            except BaseException as e:
+                future.set_exception(e)
+                # Failures are not cached; the next caller retries.
+                with self._lock:
+                    if self._entries.get(key) is entry:
+                        del self._entries[key]
+        return future.result()
+
+# Module-level, so it survives Streamlit reruns and is shared by the PDF and HTML cover letters.
+_cover_letter_memo = _SingleFlightMemo(ttl=3600)
+
+@metrics.timed('cover_letter')
+def generate_cover_letter_text(llm_client: Groq | None, data: dict, polish: bool = False, itinerary: Itinerary | None = None) -> str:
+    """Returns the visa cover letter; with polish=True the locally filled letter is reworded by the LLM.
+
+    Calls with the same letter fields share one generation, so every format gets the same text."""
+    polish = polish and llm_client is not None
+    fields = _cover_letter_fields(data, itinerary)
+    key = hashlib.sha256(json.dumps([fields, polish], sort_keys=True).encode('utf-8')).hexdigest()
+    return _cover_letter_memo.get_or_compute(key, lambda: _compose_cover_letter(llm_client, fields, polish))
+
+def _compose_cover_letter(llm_client: Groq | None, fields: dict, polish: bool) -> str:
+    letter = COVER_LETTER_TEMPLATE.safe_substitute(fields)
+    if not polish:
+        return letter
+
+    prompt = f"""You are editing a visa cover letter. Improve its wording and flow while keeping every fact unchanged:
+    names, dates, country, job title, company, contact number and the enclosed documents list.
+    DO NOT add any conversational text like "Here is the letter...".
+    DO NOT add any descriptions of formatting or extra placeholders like "[Signature]".
+    Produce ONLY the raw letter text and nothing else.
+
+    --- LETTER ---
+    {letter}
     """
-    
-    chat_completion = llm_client.chat.completions.create(
-        messages=[{"role": "user", "content": prompt}],
-        model="llama3-8b-8192"
-    )
-    
-    # Return only the raw message content, which should now be clean.
+    with metrics.timer('llm', 'llama3-8b-8192'):
+        chat_completion = llm_client.chat.completions.create(
+            messages=[{"role": "user", "content": prompt}],
+            model="llama3-8b-8192"
+        )
     return chat_completion.choices[0].message.content
-# Replace the get_hotel_options function with this one.
-# The other functions in the file remain unchanged.
 
-def get_all_hotels(supabase: Client) -> list:
-    """Fetches ALL hotel records from the Supabase table."""
+# --- HOTEL CATALOGUE ---
+
+def get_all_hotels(supabase: Client) -> tuple:
+    """Returns the hotel catalogue from the process-wide TTL cache (see hotel_catalogue); raises HotelCatalogueError."""
+    try:
+        return hotel_catalogue.default_catalogue.hotels(supabase)
+    except Exception as e:
+        raise HotelCatalogueError("fetch", hotel_catalogue.default_catalogue.table, str(e)) from e
+
+def get_hotel_index(supabase: Client) -> hotel_catalogue.HotelIndex:
+    """Returns the city/country lookup index over the cached hotel catalogue; raises HotelCatalogueError."""
     try:
-        # We fetch everything and will filter it in the main app.
-        response = supabase.table("hotel_attraction_list").select("*").execute()
-        return response.data
+        return hotel_catalogue.default_catalogue.index(supabase)
     except Exception as e:
-        st.error(f"Fatal Error: Could not fetch hotel database. {e}")
-        return []
\ No newline at end of file
+        raise HotelCatalogueError("fetch", hotel_catalogue.default_catalogue.table, str(e)) from e
@@ -0,0 +1,163 @@
+import document_cache
+import html_generator
+import metrics
+import pdf_generator
+import services
+from itinerary import Itinerary
+from task_graph import TaskGraph
+
+# --- DOCUMENTS ---
+
+# name -> (generator, file name, content type); URLs are stored under f"{name}_url".
+DOCUMENTS = {
+    'pdf_flight_ticket': (pdf_generator.create_flight_ticket_pdf, 'flight.pdf', 'application/pdf'),
+    'pdf_hotel_booking': (pdf_generator.create_hotel_booking_pdf, 'hotel.pdf', 'application/pdf'),
+    'pdf_itinerary': (pdf_generator.create_itinerary_pdf, 'itinerary.pdf', 'application/pdf'),
+    'pdf_cover_letter': (pdf_generator.create_cover_letter_pdf, 'cover_letter.pdf', 'application/pdf'),
+    'html_flight': (html_generator.create_flight_ticket_html, 'flight.html', 'text/html'),
+    'html_hotel': (html_generator.create_hotel_booking_html, 'hotel.html', 'text/html'),
+    'html_itinerary': (html_generator.create_itinerary_html, 'itinerary.html', 'text/html'),
+    'html_cover_letter': (html_generator.create_cover_letter_html, 'cover_letter.html', 'text/html'),
+    'pdf_visa_pack': (pdf_generator.create_visa_pack_pdf, 'visa_pack.pdf', 'application/pdf'),
+}
+HOTEL_DOCUMENTS = {'pdf_hotel_booking', 'html_hotel'}
+HTML_DOCUMENTS = {'html_flight', 'html_hotel', 'html_itinerary', 'html_cover_letter'}
+COVER_LETTER_DOCUMENTS = {'pdf_cover_letter', 'html_cover_letter'}
+# PDF documents a visa pack can bundle -> their section in pdf_generator.VISA_PACK_SECTIONS.
+VISA_PACK_PARTS = {'pdf_cover_letter': 'cover_letter', 'pdf_flight_ticket': 'flight_ticket', 'pdf_itinerary': 'itinerary', 'pdf_hotel_booking': 'hotel_booking'}
+
+def build_db_record(form_data: dict, document_urls: dict) -> dict:
+    """Prepares the travel_records row: drops the in-memory hotel selections and stringifies dates."""
+    db_record = form_data.copy()
+    del db_record['selected_hotels_per_trip']
+
+    serializable_trips = []
+    for trip in db_record['trips']:
+        trip_copy = trip.copy()
+        trip_copy['arrival_date'] = str(trip['arrival_date'])
+        trip_copy['departure_date'] = str(trip['departure_date'])
+        serializable_trips.append(trip_copy)
+
+    db_record['trips'] = serializable_trips
+    db_record.update(document_urls)
+    return db_record
+
+# --- SHARED STYLESHEET ---
+
+_stylesheet_urls = {}
+
+def publish_theme_stylesheet(supabase, bucket_name: str) -> str | None:
+    """Uploads the HTML theme once per theme version and returns its URL; None if the upload failed.
+
+    The object path carries the stylesheet's content hash, so an existing copy is always the right one."""
+    key = (getattr(supabase, 'supabase_url', ''), bucket_name, html_generator.THEME_FILE)
+    if key not in _stylesheet_urls:
+        try:
+            stylesheet = html_generator.THEME_STYLESHEET.encode('utf-8')
+            variants = services.compress_variants(stylesheet) if services.PRECOMPRESSED_VARIANTS else None
+            _stylesheet_urls[key] = services.upload_precompressed(
+                supabase, stylesheet, variants, bucket_name, html_generator.THEME_FILE, 'text/css', immutable=True)
+        except services.UploadError:
+            # The documents fall back to inline styles.
+            return None
+    return _stylesheet_urls[key]
+
+# --- SUBMISSION GRAPH ---
+
+def _render(generator, source, **kwargs) -> bytes:
+    content = document_cache.render(generator, source, **kwargs)
+    return content.encode('utf-8') if isinstance(content, str) else content
+
+def timing_summary(graph: TaskGraph) -> dict:
+    """Per-record timings: seconds per finished task plus the critical path so far."""
+    path, elapsed = graph.critical_path()
+    stages = {name: round(task.duration, 4) for name, task in graph.tasks.items() if task.finished is not None}
+    return {'elapsed_s': round(elapsed, 4), 'critical_path': path, 'stages': stages}
+
+def build_submission_graph(supabase, llm_client, form_data: dict, documents: list[str],
+                           polish_cover_letter: bool = False, bucket_name: str = "travel-documents",
+                           bundle_pdfs: bool = False, shared_stylesheet: bool = html_generator.SHARED_STYLESHEET) -> TaskGraph:
+    """Expresses one submission as a dependency graph.
+
+    form_data feeds the renderers, the cover letter text feeds both cover letter renderers,
+    each rendered document feeds its upload, and every upload feeds the travel_records insert.
+    The cover letter text is started first so a (slow) LLM call overlaps the other renders.
+    The itinerary is normalized once here and shared by every generator.
+    With bundle_pdfs, the selected PDFs become sections of one visa pack: one render, one upload.
+    With shared_stylesheet, HTML documents link the theme stylesheet uploaded by the 'stylesheet' task.
+    HTML documents are stored with pre-compressed gzip/brotli variants."""
+    graph = TaskGraph()
+    record_uuid = form_data['uuid']
+    itinerary = Itinerary.from_form_data(form_data)
+    documents = [d for d in documents if d not in HOTEL_DOCUMENTS or form_data.get('selected_hotels_per_trip')]
+    pack_sections = [VISA_PACK_PARTS[d] for d in documents if d in VISA_PACK_PARTS] if bundle_pdfs else []
+    if pack_sections:
+        documents = [d for d in documents if d not in VISA_PACK_PARTS] + ['pdf_visa_pack']
+    elif 'pdf_visa_pack' in documents:
+        pack_sections = list(pdf_generator.VISA_PACK_SECTIONS)
+
+    if COVER_LETTER_DOCUMENTS.intersection(documents) or 'cover_letter' in pack_sections:
+        graph.add('cover_letter_text', lambda: services.generate_cover_letter_text(llm_client, form_data, polish=polish_cover_letter, itinerary=itinerary), priority=10)
+
+    html_deps = []
+    if shared_stylesheet and HTML_DOCUMENTS.intersection(documents):
+        graph.add('stylesheet', lambda: publish_theme_stylesheet(supabase, bucket_name), priority=5)
+        html_deps = ['stylesheet']
+
+    uploads = []
+    for name in documents:
+        generator, file_name, content_type = DOCUMENTS[name]
+        if name == 'html_cover_letter':
+            graph.add(f'render:{name}', lambda text, css=None, g=generator: _render(g, text, stylesheet_url=css), deps=['cover_letter_text'] + html_deps)
+        elif name in COVER_LETTER_DOCUMENTS:
+            graph.add(f'render:{name}', lambda text, g=generator: _render(g, text), deps=['cover_letter_text'])
+        elif name == 'pdf_visa_pack':
+            # The letter text and sections go into the source, so the document cache keys on them too.
+            graph.add(f'render:{name}', lambda text=None, g=generator: _render(
+                g, {**form_data, 'cover_letter_text': text, 'visa_pack_sections': pack_sections}, itinerary=itinerary,
+            ), deps=['cover_letter_text'] if 'cover_letter' in pack_sections else [])
+        elif name in HTML_DOCUMENTS:
+            graph.add(f'render:{name}', lambda css=None, g=generator: _render(g, form_data, itinerary=itinerary, stylesheet_url=css), deps=html_deps)
+        else:
+            graph.add(f'render:{name}', lambda g=generator: _render(g, form_data, itinerary=itinerary))
+        if name in HTML_DOCUMENTS and services.PRECOMPRESSED_VARIANTS:
+            # Compressed once here; the gzip/brotli siblings are stored next to the document.
+            graph.add(f'compress:{name}', services.compress_variants, deps=[f'render:{name}'])
+            uploads.append(graph.add(
+                f'upload:{name}',
+                lambda content, variants, path=f"{record_uuid}/{file_name}", ct=content_type: services.upload_precompressed(
+                    supabase, content, variants, bucket_name, path, ct),
+                deps=[f'render:{name}', f'compress:{name}'],
+            ))
+            continue
+        uploads.append(graph.add(
+            f'upload:{name}',
+            lambda content, path=f"{record_uuid}/{file_name}", ct=content_type: services.upload_with_retry(supabase, content, bucket_name, path, ct),
+            deps=[f'render:{name}'],
+        ))
+
+    def insert_record(*urls):
+        document_urls = {f"{upload.split(':', 1)[1]}_url": url for upload, url in zip(uploads, urls) if url}
+        if document_urls:
+            db_record = build_db_record(form_data, document_urls)
+            if metrics.RECORD_TIMINGS:
+                db_record['timings'] = timing_summary(graph)
+            with metrics.timer('db_insert', 'travel_records'):
+                supabase.table("travel_records").insert(db_record).execute()
+        return document_urls
+
+    graph.add('db_insert', insert_record, deps=uploads, allow_failed_deps=True)
+    return graph
+
+def run_submission(supabase, llm_client, form_data: dict, documents: list[str], polish_cover_letter: bool = False,
+                   on_task_done=None, bundle_pdfs: bool = False, shared_stylesheet: bool = html_generator.SHARED_STYLESHEET) -> tuple[dict, TaskGraph]:
+    """Runs the submission graph; returns the stored document URLs and the finished graph (errors, timings)."""
+    graph = build_submission_graph(supabase, llm_client, form_data, documents, polish_cover_letter, bundle_pdfs=bundle_pdfs,
+                                   shared_stylesheet=shared_stylesheet)
+    results = graph.run(on_task_done=on_task_done)
+    metrics.registry.flush()
+    document_urls = results.get('db_insert')
+    if document_urls is None:
+        # The insert itself failed; still report what was uploaded.
+        document_urls = {f"{name.split(':', 1)[1]}_url": url for name, url in results.items() if name.startswith('upload:')}
+    return document_urls, graph
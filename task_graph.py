@@ -0,0 +1,113 @@
+import concurrent.futures
+import threading
+import time
+
+# --- TASK GRAPH ---
+
+class Task:
+    """One node of a TaskGraph: a callable that receives its dependencies' results as positional arguments."""
+    __slots__ = ('name', 'func', 'deps', 'priority', 'allow_failed_deps', 'result', 'error', 'started', 'finished')
+
+    def __init__(self, name: str, func, deps: tuple, priority: int, allow_failed_deps: bool):
+        self.name, self.func, self.deps = name, func, deps
+        self.priority, self.allow_failed_deps = priority, allow_failed_deps
+        self.result = self.error = self.started = self.finished = None
+
+    @property
+    def duration(self) -> float:
+        return (self.finished - self.started) if self.started is not None and self.finished is not None else 0.0
+
+class SkippedError(Exception):
+    """Recorded for a task that did not run because a dependency failed."""
+
+class TaskGraph:
+    """Runs a small dependency graph on a thread pool, starting higher-priority ready tasks first."""
+
+    def __init__(self):
+        self.tasks = {}
+
+    def add(self, name: str, func, deps=(), priority: int = 0, allow_failed_deps: bool = False) -> str:
+        """Adds a task. With allow_failed_deps, failed dependencies are passed as None instead of skipping the task."""
+        missing = [d for d in deps if d not in self.tasks]
+        if missing:
+            raise ValueError(f"Task {name!r} depends on unknown tasks {missing}")
+        self.tasks[name] = Task(name, func, tuple(deps), priority, allow_failed_deps)
+        return name
+
+    def run(self, max_workers: int = 4, on_task_done=None) -> dict:
+        """Executes every task once its dependencies are done; returns {name: result} for the tasks that succeeded.
+
+        on_task_done(task, finished_count, total), if given, is called from the worker thread after each task."""
+        remaining = {name: set(task.deps) for name, task in self.tasks.items()}
+        dependents = {name: [] for name in self.tasks}
+        for name, task in self.tasks.items():
+            for dep in task.deps:
+                dependents[dep].append(name)
+        self._origin = time.perf_counter()
+        lock, all_done = threading.Lock(), threading.Event()
+        pending = [len(self.tasks)]
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="task") as pool:
+            def start(names):
+                for name in sorted(names, key=lambda n: -self.tasks[n].priority):
+                    pool.submit(execute, self.tasks[name])
+
+            def execute(task):
+                failed = [self.tasks[d] for d in task.deps if self.tasks[d].error is not None]
+                ready = []
+                try:
+                    if failed and not task.allow_failed_deps:
+                        task.error = SkippedError(f"skipped because {failed[0].name} failed")
+                    else:
+                        task.started = time.perf_counter()
+                        try:
+                            task.result = task.func(*[self.tasks[d].result for d in task.deps])
+                        except BaseException as e:
+                            # The pool would swallow it anyway; recorded so dependents are skipped, not stalled.
+                            task.error = e
+                        task.finished = time.perf_counter()
+                finally:
+                    # Always counted, or run() would wait on all_done forever.
+                    with lock:
+                        for child in dependents[task.name]:
+                            remaining[child].discard(task.name)
+                            if not remaining[child]:
+                                ready.append(child)
+                        pending[0] -= 1
+                        finished_count = len(self.tasks) - pending[0]
+                    try:
+                        if on_task_done:
+                            try:
+                                on_task_done(task, finished_count, len(self.tasks))
+                            except Exception:
+                                pass  # Progress reporting must never stall the graph.
+                    finally:
+                        start(ready)
+                        if finished_count == len(self.tasks):
+                            all_done.set()
+
+            if self.tasks:
+                start([name for name, deps in remaining.items() if not deps])
+                all_done.wait()
+        return {name: task.result for name, task in self.tasks.items() if task.error is None}
+
+    @property
+    def errors(self) -> dict:
+        return {name: task.error for name, task in self.tasks.items() if task.error is not None}
+
+    def critical_path(self) -> tuple[list[str], float]:
+        """Returns the chain of tasks that determined total wall-clock time, and that time in seconds.
+
+        Walks back from the task that finished last, each step following the dependency that finished latest."""
+        ran = [task for task in self.tasks.values() if task.finished is not None]
+        if not ran:
+            return [], 0.0
+        task = max(ran, key=lambda t: t.finished)
+        path, end = [task.name], task.finished
+        while True:
+            deps = [self.tasks[d] for d in task.deps if self.tasks[d].finished is not None]
+            if not deps:
+                break
+            task = max(deps, key=lambda t: t.finished)
+            path.append(task.name)
+        return path[::-1], end - self._origin
@@ -0,0 +1,51 @@
+import hotel_catalogue
+from local_backends import LocalSupabase
+
+class FlakyIncrementalQueries:
+    """Wraps a client so the first `failures` change-tracking selects time out."""
+
+    def __init__(self, supabase, failures: int = 1):
+        self.supabase, self.failures = supabase, failures
+
+    def table(self, name):
+        query = self.supabase.table(name)
+        select = query.select
+
+        def flaky_select(columns="*"):
+            if "updated_at" in columns and self.failures:
+                self.failures -= 1
+                raise TimeoutError("read timed out")
+            return select(columns)
+        query.select = flaky_select
+        return query
+
+def _seed(supabase, count):
+    for i in range(count):
+        supabase.table("hotel_attraction_list").insert({
+            "Hotel Name": f"Hotel {i}", "City": "Paris", "Country": "France", "Rate": 100 + i,
+            "updated_at": f"2026-01-01T00:00:0{i}+00:00",
+        }).execute()
+
+def test_transient_error_keeps_incremental_refreshes(tmp_path):
+    supabase = LocalSupabase(str(tmp_path))
+    _seed(supabase, 3)
+    catalogue = hotel_catalogue.HotelCatalogue(ttl=0)
+    flaky = FlakyIncrementalQueries(supabase)
+
+    assert len(catalogue.hotels(flaky)) == 3  # Served by the full fallback fetch.
+    assert catalogue._incremental
+
+    catalogue._refresh(flaky)  # Rebuilds the keys with a full change-tracking fetch.
+    assert len(catalogue._hotels) == 3 and catalogue._last_change == "2026-01-01T00:00:02+00:00"
+    supabase.table("hotel_attraction_list").insert({
+        "Hotel Name": "Hotel 3", "City": "Lyon", "Country": "France", "Rate": 90, "updated_at": "2026-01-02T00:00:00+00:00",
+    }).execute()
+    catalogue._refresh(flaky)
+    assert catalogue._incremental and len(catalogue._hotels) == 4
+
+def test_missing_column_disables_incremental_refreshes(tmp_path):
+    supabase = LocalSupabase(str(tmp_path))
+    supabase.table("hotel_attraction_list").insert({"Hotel Name": "Hotel 0", "City": "Rome", "Country": "Italy", "Rate": 80}).execute()
+    catalogue = hotel_catalogue.HotelCatalogue(ttl=0)
+    assert len(catalogue.hotels(supabase)) == 1
+    assert not catalogue._incremental
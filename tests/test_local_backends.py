@@ -0,0 +1,10 @@
+import concurrent.futures
+
+from local_backends import CannedLLM
+
+def test_canned_llm_counts_concurrent_calls():
+    llm = CannedLLM(latency=0, reply="ok")
+    messages = [{'role': 'user', 'content': "letter"}]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: llm.chat.completions.create(messages=messages, model="m"), range(400)))
+    assert llm.calls == 400
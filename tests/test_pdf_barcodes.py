@@ -0,0 +1,51 @@
+import contextlib
+
+import pytest
+
+import pdf_barcodes
+
+class RecordingPDF:
+    """Collects the filled rectangles a drawer paints, with the fill colour in effect."""
+
+    def __init__(self):
+        self.fill_color, self.rects = (0, 0, 0), []
+
+    @contextlib.contextmanager
+    def local_context(self, fill_color):
+        previous, self.fill_color = self.fill_color, fill_color
+        try:
+            yield
+        finally:
+            self.fill_color = previous
+
+    def rect(self, x, y, w, h, style=None):
+        self.rects.append((self.fill_color, x, y, w, h))
+
+def test_qr_code_is_drawn_inside_a_quiet_zone():
+    pytest.importorskip('qrcode')
+    matrix = pdf_barcodes.qr_matrix("TRIP1234/PNR567")
+    pdf = RecordingPDF()
+    pdf_barcodes.draw_qr_code(pdf, "TRIP1234/PNR567", x=10, y=20, size=33)
+
+    module = 33 / (len(matrix) + 2 * pdf_barcodes.QR_QUIET_ZONE)
+    quiet = pdf_barcodes.QR_QUIET_ZONE * module
+    background, *dark = pdf.rects
+    assert background == ((255, 255, 255), 10, 20, 33, 33)
+
+    # Rebuild the module grid from the merged runs; it must match the matrix exactly.
+    grid = [[False] * len(matrix) for _ in matrix]
+    for color, x, y, w, h in dark:
+        assert color == (0, 0, 0)
+        assert x >= 10 + quiet - 1e-9 and y >= 20 + quiet - 1e-9
+        assert x + w <= 10 + 33 - quiet + 1e-9 and y + h <= 20 + 33 - quiet + 1e-9
+        row, col = round((y - 20 - quiet) / module), round((x - 10 - quiet) / module)
+        for offset in range(round(w / module)):
+            grid[row][col + offset] = True
+    assert grid == [list(row) for row in matrix]
+
+def test_code128_fills_its_box():
+    pdf = RecordingPDF()
+    pdf_barcodes.draw_code128(pdf, "1234567890", x=0, y=0, w=56, h=8)
+    assert pdf.rects and all(color == (0, 0, 0) and h == 8 for color, _, _, _, h in pdf.rects)
+    _, x, _, w, _ = pdf.rects[-1]
+    assert abs(x + w - 56) < 1e-9
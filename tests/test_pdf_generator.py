@@ -0,0 +1,27 @@
+import datetime
+
+import pytest
+
+import benchmark
+import pdf_generator
+
+def _record():
+    form_data = benchmark.make_form_data(2, 2, 1, 1)
+    form_data['created_at'] = '2026-03-04T05:06:07+00:00'
+    return form_data
+
+def test_regenerated_record_is_byte_identical():
+    form_data = _record()
+    for generator in (pdf_generator.create_flight_ticket_pdf, pdf_generator.create_hotel_booking_pdf,
+                      pdf_generator.create_itinerary_pdf, pdf_generator.create_visa_pack_pdf):
+        assert generator(form_data) == generator(dict(form_data)), generator.__name__
+
+def test_creation_date_comes_from_the_record():
+    assert b"/CreationDate (D:20260304050607Z)" in pdf_generator.create_itinerary_pdf(_record())
+    assert pdf_generator._creation_date({'created_at': datetime.datetime(2026, 3, 4)}).tzinfo is datetime.timezone.utc
+
+def test_linearized_record_is_byte_identical(monkeypatch):
+    pytest.importorskip('pikepdf')
+    monkeypatch.setattr(pdf_generator, 'LINEARIZE', True)
+    form_data = _record()
+    assert pdf_generator.create_flight_ticket_pdf(form_data) == pdf_generator.create_flight_ticket_pdf(form_data)
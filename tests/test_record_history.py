@@ -0,0 +1,27 @@
+import uuid
+
+import pytest
+
+import record_history
+from local_backends import LocalSupabase
+
+TIED = "2026-10-17T05:00:00.5+00:00"
+
+def _names(supabase, page_size=2):
+    browser, cursor, names = record_history.HistoryBrowser(), None, []
+    while True:
+        page = browser.page(supabase, cursor=cursor, page_size=page_size)
+        names += [row['passenger_name'] for row in page.rows]
+        cursor = page.next_cursor
+        if cursor is None:
+            return names
+
+@pytest.mark.parametrize("make_id", [None, lambda i: str(uuid.UUID(int=i + 1))], ids=["bigint", "uuid"])
+def test_pages_through_records_created_in_the_same_instant(tmp_path, make_id):
+    supabase = LocalSupabase(str(tmp_path))
+    for i in range(7):
+        row = {'created_at': TIED if i < 5 else f"2026-10-17T06:00:0{i}+00:00", 'passenger_name': f"P{i}", 'trips': [], 'family_members': []}
+        if make_id:
+            row['id'] = make_id(i)
+        supabase.table("travel_records").insert(row).execute()
+    assert _names(supabase) == ["P6", "P5", "P4", "P3", "P2", "P1", "P0"]
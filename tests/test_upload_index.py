@@ -0,0 +1,20 @@
+import hashlib
+
+import services
+import upload_index
+from local_backends import LocalSupabase
+
+def test_overwritten_path_is_not_reused_for_its_old_bytes(tmp_path):
+    supabase = LocalSupabase(str(tmp_path / "backend"))
+    index = upload_index.UploadIndex(str(tmp_path / "index.sqlite3"))
+
+    url_a = services.upload_file(supabase, b"document A", "docs", "record-1/flight.pdf", "application/pdf", index=index)
+    url_b = services.upload_file(supabase, b"document B", "docs", "record-1/flight.pdf", "application/pdf", index=index)
+    assert url_b == url_a  # Same path, now holding B.
+
+    url_again = services.upload_file(supabase, b"document A", "docs", "record-2/flight.pdf", "application/pdf", index=index)
+    assert url_again != url_b
+    with open(url_again.removeprefix("file://"), "rb") as f:
+        assert f.read() == b"document A"
+    # A fresh process reading the same index file must not hand out B's URL either.
+    assert upload_index.UploadIndex(index.path).get(supabase.supabase_url, "docs", hashlib.sha256(b"document A").hexdigest(), "application/pdf") == url_again
@@ -2,9 +2,16 @@ import streamlit as st
 import pandas as pd
 import datetime
 from supabase import Client
+from hotel_catalogue import HotelIndex
+import job_queue
+import record_history
 
-def manage_trips_and_guests(all_hotels: list):
-    """Renders the UI for managing trips and guests, with detailed flight inputs per trip."""
+def manage_trips_and_guests(hotel_index: HotelIndex):
+    """Renders the UI for managing trips and guests, with detailed flight inputs per trip.
+
+    The trip list, each trip and the guest list are fragments: editing trip 3 reruns only trip 3's
+    widgets and hotel options. Their only shared state is st.session_state.trips/family_members
+    and the per-trip widget keys, which the main form reads on submit."""
     if 'family_members' not in st.session_state:
         st.session_state.family_members = []
     if 'trips' not in st.session_state:
@@ -15,66 +22,118 @@ def manage_trips_and_guests(all_hotels: list):
             'dep_time': '10:30', 'arr_time': '18:45'
         }]
 
+    with st.expander("Manage Trips & Guests", expanded=True):
+        _trip_list_editor(hotel_index)
+        st.markdown("---")
+        _guest_editor()
+
+@st.fragment
+def _trip_list_editor(hotel_index: HotelIndex):
+    """Adding a trip reruns this fragment only; every trip inside it is its own fragment."""
     def add_trip():
         # Add 'airline' to newly added trips
         st.session_state.trips.append({
             'country': '', 'arrival_date': datetime.date.today(), 'departure_date': datetime.date.today() + datetime.timedelta(days=7),
             'airline': 'Travaky Airlines', 'pnr': '', 'flight_no': '', 'ticket_no': '', 'dep_time': '', 'arr_time': ''
         })
-    def remove_trip(i):
+
+    st.subheader("Travel Plan & Flight Details")
+    st.button("Add Trip", on_click=add_trip)
+    for i in range(len(st.session_state.trips)):
+        _trip_editor(i, hotel_index)
+
+@st.fragment
+def _trip_editor(i: int, hotel_index: HotelIndex):
+    """Widgets and hotel options for trip i; reruns on its own when one of its widgets changes."""
+    trip = st.session_state.trips[i]
+    st.markdown(f"---")
+    st.markdown(f"**Trip {i+1}**")
+
+    # --- Trip Destination and Dates ---
+    c1, c2, c3, c4 = st.columns([3, 2, 2, 1])
+    trip['country'] = c1.text_input("Country/City", trip.get('country', ''), key=f"country_{i}")
+    trip['arrival_date'] = c2.date_input("Arrival Date", trip.get('arrival_date'), key=f"arr_{i}")
+    trip['departure_date'] = c3.date_input("Departure Date", trip.get('departure_date'), key=f"dep_{i}")
+    if c4.button("❌", key=f"rem_trip_{i}", help="Remove trip"):
+        # Removing changes the shape of the trip list, which needs a full rerun to redraw.
         st.session_state.trips.pop(i)
+        st.rerun()
+
+    # --- Manual Flight Information Inputs Per Trip ---
+    st.markdown("###### Flight Details for this Leg")
+
+    # <<< NEW: Added Airline Name input field >>>
+    c1, c2, c3 = st.columns(3)
+    trip['airline'] = c1.text_input("Airline Name", trip.get('airline', 'Travaky Airlines'), key=f"airline_{i}")
+    trip['pnr'] = c2.text_input("PNR", trip.get('pnr', ''), key=f"pnr_{i}")
+    trip['flight_no'] = c3.text_input("Flight Number", trip.get('flight_no', ''), key=f"flight_no_{i}")
+
+    c1, c2, c3 = st.columns(3)
+    trip['dep_time'] = c1.text_input("Departure Time (e.g., 10:30)", trip.get('dep_time', ''), key=f"dep_time_{i}")
+    trip['arr_time'] = c2.text_input("Arrival Time (e.g., 18:45)", trip.get('arr_time', ''), key=f"arr_time_{i}")
+    trip['ticket_no'] = c3.text_input("E-Ticket Number", trip.get('ticket_no', ''), key=f"ticket_no_{i}")
+
+    # --- Hotel Selection Logic ---
+    # Exact city/country matches first; partial input like "par" falls back to prefix/fuzzy matches.
+    options_for_this_trip = list(hotel_index.search(trip.get('country', '')))
+    if options_for_this_trip:
+        def format_hotel_option(hotel): return f"{hotel['Hotel Name']} ({hotel['City']}) - EUR {hotel['Rate']}/night"
+        st.selectbox(f"Select Hotel for {trip.get('country', f'Trip {i+1}')}", options=[None] + options_for_this_trip, format_func=lambda h: "No Selection" if h is None else format_hotel_option(h), key=f"hotel_selection_{i}")
+
+@st.fragment
+def _guest_editor():
+    """The accompanying guests list; adding, removing or editing a guest reruns only this fragment."""
     def add_family():
         st.session_state.family_members.append({'name': '', 'age': 0, 'gender': 'Other'})
     def remove_family(i):
         st.session_state.family_members.pop(i)
 
-    with st.expander("Manage Trips & Guests", expanded=True):
-        st.subheader("Travel Plan & Flight Details")
-        st.button("Add Trip", on_click=add_trip)
-        
-        for i, trip in enumerate(st.session_state.trips):
-            st.markdown(f"---")
-            st.markdown(f"**Trip {i+1}**")
-            
-            # --- Trip Destination and Dates ---
-            c1, c2, c3, c4 = st.columns([3, 2, 2, 1])
-            trip['country'] = c1.text_input("Country/City", trip.get('country', ''), key=f"country_{i}")
-            trip['arrival_date'] = c2.date_input("Arrival Date", trip.get('arrival_date'), key=f"arr_{i}")
-            trip['departure_date'] = c3.date_input("Departure Date", trip.get('departure_date'), key=f"dep_{i}")
-            c4.button("❌", key=f"rem_trip_{i}", on_click=remove_trip, args=(i,), help="Remove trip")
-
-            # --- Manual Flight Information Inputs Per Trip ---
-            st.markdown("###### Flight Details for this Leg")
-            
-            # <<< NEW: Added Airline Name input field >>>
-            c1, c2, c3 = st.columns(3)
-            trip['airline'] = c1.text_input("Airline Name", trip.get('airline', 'Travaky Airlines'), key=f"airline_{i}")
-            trip['pnr'] = c2.text_input("PNR", trip.get('pnr', ''), key=f"pnr_{i}")
-            trip['flight_no'] = c3.text_input("Flight Number", trip.get('flight_no', ''), key=f"flight_no_{i}")
-            
-            c1, c2, c3 = st.columns(3)
-            trip['dep_time'] = c1.text_input("Departure Time (e.g., 10:30)", trip.get('dep_time', ''), key=f"dep_time_{i}")
-            trip['arr_time'] = c2.text_input("Arrival Time (e.g., 18:45)", trip.get('arr_time', ''), key=f"arr_time_{i}")
-            trip['ticket_no'] = c3.text_input("E-Ticket Number", trip.get('ticket_no', ''), key=f"ticket_no_{i}")
-
-            # --- Hotel Selection Logic ---
-            location_lower = trip['country'].lower() if trip.get('country') else ''
-            options_for_this_trip = [h for h in all_hotels if (h.get('City') and h.get('City').lower() == location_lower) or (h.get('Country') and h.get('Country').lower() == location_lower)]
-            if options_for_this_trip:
-                def format_hotel_option(hotel): return f"{hotel['Hotel Name']} ({hotel['City']}) - EUR {hotel['Rate']}/night"
-                st.selectbox(f"Select Hotel for {trip.get('country', f'Trip {i+1}')}", options=[None] + options_for_this_trip, format_func=lambda h: "No Selection" if h is None else format_hotel_option(h), key=f"hotel_selection_{i}")
-        
-        st.markdown("---")
-        st.subheader("Accompanying Guests")
-        st.button("Add Guest", on_click=add_family)
-        for i, member in enumerate(st.session_state.family_members):
-            # <<< CHANGE HERE: Added a column for the Gender selectbox >>>
-            c1, c2, c3, c4 = st.columns([4, 1, 2, 1]) 
-            member['name'] = c1.text_input(f"Guest {i+1}", member.get('name', ''), key=f"fam_name_{i}")
-            member['age'] = c2.number_input("Age", 0, 120, member.get('age', 0), key=f"fam_age_{i}")
-            # Add the gender selectbox and store its value
-            member['gender'] = c3.selectbox("Gender", ["Male", "Female", "Other"], key=f"fam_gender_{i}")
-            c4.button("❌", key=f"rem_fam_{i}", on_click=remove_family, args=(i,), help="Remove guest")
+    st.subheader("Accompanying Guests")
+    st.button("Add Guest", on_click=add_family)
+    for i, member in enumerate(st.session_state.family_members):
+        # <<< CHANGE HERE: Added a column for the Gender selectbox >>>
+        c1, c2, c3, c4 = st.columns([4, 1, 2, 1]) 
+        member['name'] = c1.text_input(f"Guest {i+1}", member.get('name', ''), key=f"fam_name_{i}")
+        member['age'] = c2.number_input("Age", 0, 120, member.get('age', 0), key=f"fam_age_{i}")
+        # Add the gender selectbox and store its value
+        member['gender'] = c3.selectbox("Gender", ["Male", "Female", "Other"], key=f"fam_gender_{i}")
+        c4.button("❌", key=f"rem_fam_{i}", on_click=remove_family, args=(i,), help="Remove guest")
+
+@st.fragment(run_every=1.0)
+def display_job_progress(queue: job_queue.JobQueue, job_id: str):
+    """Polls a queued job once a second; reruns the whole app once it has finished to show the results."""
+    job = queue.get(job_id)
+    if job is None or job.finished:
+        st.rerun()
+    progress = job.progress or {}
+    done, total = progress.get('done', 0), progress.get('total') or 1
+    label = "Waiting for a worker..." if job.status == job_queue.QUEUED else f"Generating and uploading documents... ({progress.get('last', 'starting')})"
+    st.progress(done / total, text=label)
+
+def display_job_result(job: job_queue.Job):
+    """Errors, timings and document links of a finished job."""
+    result = job.result or {}
+    for task_name, error in result.get('errors', {}).items():
+        if task_name == 'db_insert':
+            st.error(f"Database error: {error}")
+        else:
+            st.error(f"Error in {task_name}: {error}")
+    if job.status == job_queue.FAILED and not result:
+        st.error(f"Document generation failed: {job.error}")
+
+    document_urls = result.get('document_urls')
+    if document_urls:
+        st.success("✅ Documents generated and uploaded!")
+        timings = result['timings']
+        st.caption(f"Completed in {timings['elapsed_s']:.2f}s · critical path: {' → '.join(timings['critical_path'])}")
+        with st.expander("Stage timings"):
+            st.table({'stage': list(timings['stages']), 'seconds': list(timings['stages'].values())})
+        if job.status == job_queue.DONE:
+            st.subheader("Your Permanent Document Links:")
+            for name, url in document_urls.items():
+                st.markdown(f"📄 **{name.replace('_', ' ').title()}:** [View/Download Here]({url})")
+    elif result:
+        st.warning("No documents were selected or generated.")
 
 # def display_past_records(supabase: Client):
 #     # This function remains unchanged
@@ -103,31 +162,32 @@ def manage_trips_and_guests(all_hotels: list):
 
 # In ui_components.py, replace the existing function with this one.
 
-def display_past_records(supabase: Client):
-    """Fetches and displays a detailed, explicitly ordered view of past travel records."""
+@st.fragment
+def display_past_records(supabase: Client, page_size: int = 25):
+    """Fetches and displays a detailed, explicitly ordered view of past travel records.
+
+    Runs as a fragment, so paging, searching or refreshing does not rerun the rest of the app.
+    Pages come from record_history's shared TTL store, already formatted for display."""
     st.markdown("---")
-    st.header("Previously Generated Records")
+    c1, c2, c3 = st.columns([4, 2, 1])
+    c1.header("Previously Generated Records")
+    search = c2.text_input("Search by passenger name", key="history_search", placeholder="Passenger name")
+    if c3.button("🔄 Refresh", key="refresh_past_records"):
+        record_history.default_browser.invalidate()
+
+    # Cursor stack for keyset pagination; a new search starts again from the newest record.
+    if st.session_state.get('history_search_applied') != search:
+        st.session_state.history_search_applied = search
+        st.session_state.history_cursors = [None]
+    cursors = st.session_state.setdefault('history_cursors', [None])
     try:
-        response = supabase.table("travel_records").select("*").order("created_at", desc=True).limit(10).execute()
-        if response.data:
-            df = pd.DataFrame(response.data)
+        page = record_history.default_browser.page(supabase, cursor=cursors[-1], search=search, page_size=page_size)
+        if page.rows:
+            df = pd.DataFrame(page.rows)
 
             # --- Data Preparation ---
             df['created_at'] = pd.to_datetime(df['created_at'], errors='coerce')
 
-            def format_trips(trip_list):
-                if not isinstance(trip_list, list) or not trip_list: return "N/A"
-                countries = [t.get('country', 'N/A') for t in trip_list]
-                return ", ".join(countries) if countries else "N/A"
-
-            def format_guests(guest_list):
-                if not isinstance(guest_list, list) or not guest_list: return "None"
-                guest_names = [g.get('name', 'N/A') for g in guest_list]
-                return ", ".join(guest_names) if guest_names else "None"
-
-            df['trips'] = df['trips'].apply(format_trips)
-            df['Guests'] = df['family_members'].apply(format_guests) if 'family_members' in df.columns else "None"
-
             # --- Column Configuration & Ordering ---
             
             # 1. Define the exact order and list of all columns you want to display.
@@ -138,7 +198,7 @@ def display_past_records(supabase: Client):
                 
                 # PDF Document Links
                 "pdf_flight_ticket_url", "pdf_hotel_booking_url", 
-                "pdf_itinerary_url", "pdf_cover_letter_url",
+                "pdf_itinerary_url", "pdf_cover_letter_url", "pdf_visa_pack_url",
                 
                 # HTML Document Links
                 "html_flight_url", "html_hotel_url", 
@@ -162,6 +222,7 @@ def display_past_records(supabase: Client):
                 "pdf_hotel_booking_url": st.column_config.LinkColumn("PDF Hotel Booking", display_text="🔗 PDF"),
                 "pdf_itinerary_url": st.column_config.LinkColumn("PDF Itinerary", display_text="🔗 PDF"),
                 "pdf_cover_letter_url": st.column_config.LinkColumn("PDF Cover Letter", display_text="🔗 PDF"),
+                "pdf_visa_pack_url": st.column_config.LinkColumn("PDF Visa Pack", display_text="🔗 PDF"),
 
                 # HTML Link Columns
                 "html_flight_url": st.column_config.LinkColumn("HTML Flight Ticket", display_text="🌐 HTML"),
@@ -179,6 +240,13 @@ def display_past_records(supabase: Client):
                 # Use the filtered and ordered list of columns to display
                 column_order=columns_to_display
             )
+
+            def newer(): cursors.pop()
+            def older(): cursors.append(page.next_cursor)
+            c1, c2, c3 = st.columns([1, 4, 1])
+            c1.button("← Newer", key="history_newer", on_click=newer, disabled=len(cursors) == 1)
+            c2.caption(f"Page {len(cursors)}")
+            c3.button("Older →", key="history_older", on_click=older, disabled=page.next_cursor is None)
         else:
             st.info("No records found yet.")
     except Exception as e:
@@ -0,0 +1,89 @@
+import os
+import sqlite3
+import threading
+
+# --- UPLOAD INDEX ---
+
+class UploadIndex:
+    """Remembers the public URL of every object uploaded, by (project, bucket, content hash, content type).
+
+    Lets upload_file return the URL of identical bytes stored earlier without sending them again.
+    Entries live in memory and, with a path, in a SQLite file shared by all processes on the host."""
+
+    def __init__(self, path: str | None = None):
+        self.path = path
+        self._memory = {}
+        self._lock = threading.Lock()
+        self._created = None
+
+    def _connect(self) -> sqlite3.Connection:
+        # The file and table are created on first use, not when the index is constructed (at import).
+        if self._created != self.path:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            try:
+                with conn:
+                    conn.execute("""CREATE TABLE IF NOT EXISTS uploads (
+                        project TEXT NOT NULL, bucket TEXT NOT NULL, digest TEXT NOT NULL, content_type TEXT NOT NULL,
+                        url TEXT NOT NULL, PRIMARY KEY (project, bucket, digest, content_type))""")
+            finally:
+                conn.close()
+            self._created = self.path
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, project: str, bucket: str, digest: str, content_type: str) -> str | None:
+        key = (project, bucket, digest, content_type)
+        with self._lock:
+            url = self._memory.get(key)
+        if url is None and self.path:
+            conn = self._connect()
+            try:
+                row = conn.execute("SELECT url FROM uploads WHERE project = ? AND bucket = ? AND digest = ? AND content_type = ?", key).fetchone()
+            finally:
+                conn.close()
+            if row:
+                url = row[0]
+                with self._lock:
+                    self._memory[key] = url
+        return url
+
+    def put(self, project: str, bucket: str, digest: str, content_type: str, url: str):
+        key = (project, bucket, digest, content_type)
+        with self._lock:
+            self._memory[key] = url
+        if self.path:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute("INSERT OR REPLACE INTO uploads (project, bucket, digest, content_type, url) VALUES (?, ?, ?, ?, ?)", key + (url,))
+            finally:
+                conn.close()
+
+    def discard_url(self, project: str, bucket: str, url: str):
+        """Forgets every digest that points at `url`, e.g. once the object at that path was overwritten."""
+        with self._lock:
+            for key in [key for key, value in self._memory.items() if key[:2] == (project, bucket) and value == url]:
+                del self._memory[key]
+        if self.path:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute("DELETE FROM uploads WHERE project = ? AND bucket = ? AND url = ?", (project, bucket, url))
+            finally:
+                conn.close()
+
+    def clear(self):
+        """Forgets every entry, e.g. after objects were deleted from the bucket outside the app."""
+        with self._lock:
+            self._memory.clear()
+        if self.path:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute("DELETE FROM uploads")
+            finally:
+                conn.close()
+
+# Shared by every session and worker thread in the process; TRAVAKY_UPLOAD_INDEX= (empty) keeps it in memory only.
+# Nothing is written until the first upload, so the path can still be changed after import.
+default_index = UploadIndex(os.environ.get('TRAVAKY_UPLOAD_INDEX', os.path.join('.cache', 'upload_index.sqlite3')) or None)